@@ -0,0 +1,12 @@
+import { NextResponse } from "next/server";
+import { getResultCache } from "@/lib/resultCache";
+
+// Hit, miss, store and eviction counts of the result cache since startup
+export async function GET() {
+  const cache = getResultCache();
+  if (!cache) {
+    return NextResponse.json({ enabled: false });
+  }
+  await cache.load();
+  return NextResponse.json({ enabled: true, ...cache.summary() });
+}
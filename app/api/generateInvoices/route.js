@@ -1,13 +1,16 @@
 import { NextResponse } from "next/server";
-import { spawn } from "child_process";
 import { writeFile, unlink } from "fs/promises";
 import path from "path";
 import fs from "fs/promises";
 import os from "os";
+import { diagnosticArgs, getWorkerPool } from "@/lib/pythonWorkerPool";
+import { getResultCache } from "@/lib/resultCache";
+
+// Stands in for the temporary party file path in cache keys
+const PARTY_FILE_ARG = "@party-data";
 
 export async function POST(request) {
   let partyDataPath = null;
-  let pythonProcess = null;
 
   try {
     const data = await request.json();
@@ -66,6 +69,15 @@ export async function POST(request) {
       }
     }
 
+    // An optional seed makes the run reproducible (and cacheable)
+    const seeded = data.seed !== undefined && data.seed !== null && data.seed !== "";
+    if (seeded && !/^\d+$/.test(String(data.seed))) {
+      return NextResponse.json(
+        { message: "Seed must be a non-negative integer" },
+        { status: 400 }
+      );
+    }
+
     // Validate date range
     const startDate = new Date(data.startDate);
     const endDate = new Date(data.endDate);
@@ -93,14 +105,6 @@ export async function POST(request) {
       );
     }
 
-    // Get the Python executable path and script path
-    const pythonPath = process.env.PYTHON_PATH || "python3";
-    const scriptPath = path.join(
-      process.cwd(),
-      "scripts",
-      "generate_invoices.py"
-    );
-
     let scriptArgs;
 
     if (data.generateParties) {
@@ -116,7 +120,6 @@ export async function POST(request) {
 
       // Use the new party generation functionality
       scriptArgs = [
-        scriptPath,
         data.startDate,
         data.endDate,
         data.startInvoiceNumber.toString(),
@@ -139,23 +142,12 @@ export async function POST(request) {
         );
       }
 
-      // Create a temporary file for the party data
-      const tempDir = path.join(os.tmpdir(), "invoice-generator");
-      try {
-        await fs.mkdir(tempDir, { recursive: true });
-      } catch (err) {
-        console.error("Failed to create temp directory:", err);
-      }
-
-      partyDataPath = path.join(tempDir, `party_data_${Date.now()}.csv`);
-      await writeFile(partyDataPath, data.partyData);
-
+      // The party data goes to a temporary file, written after the cache lookup
       scriptArgs = [
-        scriptPath,
         data.startDate,
         data.endDate,
         (data.startInvoiceNumber || 1).toString(),
-        partyDataPath,
+        PARTY_FILE_ARG,
         data.productName || "WHOLE PADDY GRAINS",
         (data.minPurchaseRate || 22).toString(),
         (data.maxPurchaseRate || 23).toString(),
@@ -165,96 +157,135 @@ export async function POST(request) {
       ];
     }
 
-    // Execute the Python script
-    pythonProcess = spawn(pythonPath, scriptArgs);
+    if (seeded) {
+      scriptArgs.push("--seed", String(data.seed));
+    }
 
-    return new Promise((resolve, reject) => {
-      let outputData = [];
-      let errorData = [];
+    // Create formatted filename
+    const currentDate = new Date().toISOString().split('T')[0];
+    const filename = `${data.invoiceType}_invoices_${currentDate}.csv`;
+    const headers = {
+      "Content-Type": "text/csv",
+      "Content-Disposition": `attachment; filename="${filename}"`,
+    };
 
-      pythonProcess.stdout.on("data", (data) => {
-        console.log("Python stdout:", data.toString());
-        outputData.push(data);
+    // Unseeded runs are random by design, so only seeded ones are cached
+    const cache = seeded ? getResultCache() : null;
+    const cacheKey =
+      cache && cache.key({ script: "generate_invoices.py", args: scriptArgs }, data.generateParties ? "" : data.partyData);
+    const cached = cache && (await cache.get(cacheKey));
+    if (cached) {
+      return new NextResponse(cached, {
+        status: 200,
+        headers: { ...headers, "X-Cache": "HIT" },
       });
+    }
 
-      pythonProcess.stderr.on("data", (data) => {
-        console.error("Python stderr:", data.toString());
-        errorData.push(data);
-      });
+    if (scriptArgs.includes(PARTY_FILE_ARG)) {
+      // Create a temporary file for the party data
+      const tempDir = path.join(os.tmpdir(), "invoice-generator");
+      try {
+        await fs.mkdir(tempDir, { recursive: true });
+      } catch (err) {
+        console.error("Failed to create temp directory:", err);
+      }
 
-      pythonProcess.on("error", (error) => {
-        console.error("Failed to start Python process:", error);
-        resolve(
-          NextResponse.json(
-            { message: `Failed to start Python process: ${error.message}` },
-            { status: 500 }
-          )
-        );
-      });
+      partyDataPath = path.join(tempDir, `party_data_${Date.now()}.csv`);
+      await writeFile(partyDataPath, data.partyData);
+      scriptArgs = scriptArgs.map((arg) => (arg === PARTY_FILE_ARG ? partyDataPath : arg));
+    }
 
-      pythonProcess.on("close", async (code) => {
-        // Clean up the temporary file
-        try {
-          if (partyDataPath) {
-            await unlink(partyDataPath);
-          }
-        } catch (err) {
-          console.error("Error cleaning up temp file:", err);
+    // Run the job on a warm Python worker and stream rows as they arrive
+    const cleanup = async () => {
+      try {
+        if (partyDataPath) {
+          const tempPath = partyDataPath;
+          partyDataPath = null;
+          await unlink(tempPath);
         }
+      } catch (err) {
+        console.error("Error cleaning up temp file:", err);
+      }
+    };
 
-        if (code !== 0) {
-          const errorMessage = Buffer.concat(errorData).toString();
-          console.error(
-            "Python script exited with code:",
-            code,
-            "Error:",
-            errorMessage
-          );
-          resolve(
-            NextResponse.json(
-              {
-                message: `Python script error: ${
-                  errorMessage || "Unknown error occurred"
-                }`,
-              },
-              { status: 500 }
-            )
-          );
-        } else {
-          const csvData = Buffer.concat(outputData);
-          if (!csvData.length) {
-            resolve(
-              NextResponse.json(
-                { message: "No data generated from Python script" },
-                { status: 500 }
-              )
-            );
-            return;
-          }
+    let controller;
+    // Set once the client goes away; the stream must not be touched after that
+    let cancelled = false;
+    let bytesSent = 0;
+    // Copy of the output for the result cache
+    const chunks = cache ? [] : null;
+    const body = new ReadableStream({
+      start(c) {
+        controller = c;
+      },
+      cancel() {
+        cancelled = true;
+      },
+    });
 
-          // Create formatted filename
-          const currentDate = new Date().toISOString().split('T')[0];
-          const filename = `${data.invoiceType}_invoices_${currentDate}.csv`;
+    // Resolves once the first chunk arrives (or the job ends), so errors
+    // raised before any output can still be reported as JSON
+    let markStarted;
+    const started = new Promise((resolve, reject) => {
+      markStarted = { resolve, reject };
+    });
 
-          resolve(
-            new NextResponse(csvData, {
-              status: 200,
-              headers: {
-                "Content-Type": "text/csv",
-                "Content-Disposition": `attachment; filename="${filename}"`,
-              },
-            })
-          );
+    getWorkerPool("generate_invoices.py")
+      .run({ args: [...scriptArgs, ...diagnosticArgs("generate")] }, (chunk) => {
+        bytesSent += chunk.length;
+        if (chunks) chunks.push(chunk);
+        if (!cancelled) controller.enqueue(chunk);
+        markStarted.resolve();
+      })
+      .then(
+        () => {
+          if (!cancelled) controller.close();
+          markStarted.resolve();
+          if (chunks && bytesSent) {
+            cache.set(cacheKey, Buffer.concat(chunks)).catch((error) => {
+              console.error("Result cache write failed:", error.message);
+            });
+          }
+        },
+        (error) => {
+          if (bytesSent) {
+            console.error("Python worker error after streaming began:", error.message);
+            if (!cancelled) controller.error(error);
+          }
+          markStarted.reject(error);
         }
-      });
+      )
+      .finally(cleanup);
+
+    try {
+      await started;
+    } catch (error) {
+      console.error("Python worker error:", error.message);
+      return NextResponse.json(
+        {
+          message: `Python script error: ${
+            error.message || "Unknown error occurred"
+          }`,
+        },
+        { status: 500 }
+      );
+    }
+
+    if (!bytesSent) {
+      return NextResponse.json(
+        { message: "No data generated from Python script" },
+        { status: 500 }
+      );
+    }
+
+    return new NextResponse(body, {
+      status: 200,
+      headers: cache ? { ...headers, "X-Cache": "MISS" } : headers,
     });
   } catch (error) {
     console.error("API route error:", error);
     // Clean up resources
     try {
-      if (pythonProcess) {
-        pythonProcess.kill();
-      }
       if (partyDataPath) {
         await unlink(partyDataPath);
       }
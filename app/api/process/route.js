@@ -1,6 +1,6 @@
 import { NextResponse } from "next/server";
-import { spawn } from "child_process";
-import path from "path";
+import { diagnosticArgs, getWorkerPool } from "@/lib/pythonWorkerPool";
+import { getResultCache } from "@/lib/resultCache";
 
 export async function POST(request) {
   try {
@@ -14,96 +14,58 @@ export async function POST(request) {
       );
     }
 
-    // Get the Python executable path and script path
-    const pythonPath = process.env.PYTHON_PATH || "python3";
-    const scriptPath = path.join(
-      process.cwd(),
-      "scripts",
-      "process_payments.py"
-    );
-
-    // Execute the Python script
-    const pythonProcess = spawn(pythonPath, [scriptPath]);
-
-    return new Promise((resolve, reject) => {
-      let outputData = [];
-      let errorData = [];
-
-      // Handle stdout (output from the Python script)
-      pythonProcess.stdout.on("data", (data) => {
-        // console.log(`Python stdout: ${data.toString().substring(0, 200)}...`); // Log only part to avoid flooding
-        outputData.push(data);
-      });
+    // The schedule depends only on the vouchers, so identical uploads are
+    // served from the result cache
+    const cache = getResultCache();
+    const cacheKey = cache && cache.key({ script: "process_payments.py" }, data);
+    let output = cache && (await cache.get(cacheKey));
+    const cacheStatus = output ? "HIT" : "MISS";
 
-      // Handle stderr (errors from the Python script)
-      pythonProcess.stderr.on("data", (data) => {
-        console.error("Python stderr:", data.toString());
-        errorData.push(data);
-      });
-
-      // Handle process errors
-      pythonProcess.on("error", (error) => {
-        console.error("Failed to start Python process:", error);
-        resolve(
-          NextResponse.json(
-            { message: `Failed to start Python process: ${error.message}` },
-            { status: 500 }
-          )
-        );
-      });
-
-      // Handle process completion
-      pythonProcess.on("close", (code) => {
-        if (code !== 0) {
-          const errorMessage = Buffer.concat(errorData).toString();
-          console.error(
-            "Python script exited with code:",
-            code,
-            "Error:",
-            errorMessage
-          );
-          resolve(
-            NextResponse.json(
-              {
-                message: `Python script error: ${
-                  errorMessage || "Unknown error occurred"
-                }`,
-              },
-              { status: 500 }
-            )
-          );
-        } else {
-          const csvData = Buffer.concat(outputData).toString().trim();
-          if (!csvData.length) {
-            resolve(
-              NextResponse.json(
-                { message: "No data generated from Python script" },
-                { status: 500 }
-              )
-            );
-            return;
-          }
+    // Run the job on a warm Python worker
+    try {
+      if (!output) {
+        output = await getWorkerPool("process_payments.py").run({
+          input: data,
+          args: diagnosticArgs("payments"),
+        });
+        if (cache && output.length) {
+          await cache.set(cacheKey, output).catch((error) => {
+            console.error("Result cache write failed:", error.message);
+          });
+        }
+      }
+    } catch (error) {
+      console.error("Python worker error:", error.message);
+      return NextResponse.json(
+        {
+          message: `Python script error: ${
+            error.message || "Unknown error occurred"
+          }`,
+        },
+        { status: 500 }
+      );
+    }
 
-          // Create formatted filename
-          const currentDate = new Date().toISOString().split("T")[0];
-          const filename = `payments_${currentDate}.csv`;
+    const csvData = output.toString().trim();
+    if (!csvData.length) {
+      return NextResponse.json(
+        { message: "No data generated from Python script" },
+        { status: 500 }
+      );
+    }
 
-          // Return the CSV data as a response
-          resolve(
-            new NextResponse(csvData, {
-              status: 200,
-              headers: {
-                "Content-Type": "text/csv",
-                "Content-Disposition": `attachment; filename="${filename}"`,
-              },
-            })
-          );
-        }
-      });
+    // Create formatted filename
+    const currentDate = new Date().toISOString().split("T")[0];
+    const filename = `payments_${currentDate}.csv`;
 
-      // Send the input data to the Python script
-      pythonProcess.stdin.write(data);
-      pythonProcess.stdin.end();
+    // Return the CSV data as a response
+    return new NextResponse(csvData, {
+      status: 200,
+      headers: {
+        "Content-Type": "text/csv",
+        "Content-Disposition": `attachment; filename="${filename}"`,
+        ...(cache && { "X-Cache": cacheStatus }),
+      },
     });
   } catch (error) {
     console.error("API route error:", error);
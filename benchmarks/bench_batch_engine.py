@@ -0,0 +1,100 @@
+"""Check and time the NumPy batch pricing path against the scalar integer-paise path.
+
+Usage: python benchmarks/bench_batch_engine.py [rows]
+
+First, `InvoiceGenerator.price_invoices` is fed random balances and every
+row is compared field by field with `_price_invoice` run on the same
+underlying draws. Then full sales and purchase runs are timed with and
+without `--vectorized`.
+"""
+import os
+import sys
+import time
+import random
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from generate_invoices import InvoiceGenerator, iter_invoice_rows
+
+DRAW_NAMES = ("rate", "margin", "retry_rate", "quantity")
+
+CONFIGS = [
+    # (min_rate, max_rate, min_margin, max_margin, invoice_type)
+    (22, 23, 2.25, 2.65, 'purchase'),
+    (22.5, 23.65, 0, 0, 'sales'),
+    (1, 400, 0, 30, 'purchase'),
+    (900, 1500, 5, 9.5, 'sales'),
+]
+
+
+def check_equivalence(rows, seed=0):
+    rng = random.Random(seed)
+    mismatches = 0
+    for min_rate, max_rate, min_margin, max_margin, invoice_type in CONFIGS:
+        generator = InvoiceGenerator('2024-04-01', '2024-04-30', 1, min_rate, max_rate, min_margin, max_margin, invoice_type)
+        balances = [rng.randint(0, 30000000) for _ in range(rows)]
+
+        generator.numpy_rng = np.random.default_rng(seed)
+        batch = generator.price_invoices(balances)
+
+        replay = np.random.default_rng(seed)
+        draws = {name: replay.random(rows) for name in DRAW_NAMES}
+        for i, balance in enumerate(balances):
+            expected = generator.price_invoice_or_none(balance, lambda name: float(draws[name][i]))
+            if expected != batch[i]:
+                mismatches += 1
+                if mismatches <= 5:
+                    print(f"Mismatch at row {i} ({invoice_type}, balance {balance}): {expected} != {batch[i]}")
+
+        print(f"{invoice_type:>8} rates {min_rate}-{max_rate}: {rows} rows checked, {generator.fallbacks} scalar fallbacks")
+    return mismatches
+
+
+def time_pricing(rows):
+    generator = InvoiceGenerator('2024-04-01', '2024-04-30', 1, 22, 23, 2.25, 2.65, 'purchase')
+    balances = [20000000] * rows
+
+    started = time.perf_counter()
+    for balance in balances:
+        generator.price_invoice_or_none(balance)
+    scalar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    generator.price_invoices(balances)
+    return scalar_time, time.perf_counter() - started
+
+
+def time_run(invoice_type, total_amount, vectorized):
+    random.seed(1)
+    if invoice_type == 'sales':
+        party_data = {"CASH": total_amount * 100}
+    else:
+        party_data = {f"Party {i}": 20000000 for i in range(total_amount // 200000)}
+
+    started = time.perf_counter()
+    count = sum(1 for _ in iter_invoice_rows(
+        party_data, '2024-04-01', '2034-03-31', 1, 'PADDY', 22, 23, 2.25, 2.65, invoice_type, vectorized=vectorized
+    ))
+    return count, time.perf_counter() - started
+
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    if check_equivalence(rows):
+        raise SystemExit("Batch pricing does not match the scalar path")
+
+    scalar_time, batch_time = time_pricing(rows)
+    print(f"\nPricing only, {rows} invoices: scalar {scalar_time:.3f}s, batch {batch_time:.3f}s ({scalar_time / batch_time:.1f}x)")
+
+    print("\nFull runs, including row formatting")
+    print(f"{'type':>8} {'invoices':>9} {'scalar (s)':>11} {'batch (s)':>10} {'speedup':>8}")
+    for invoice_type, total_amount in (('sales', 50_000_000), ('sales', 500_000_000), ('purchase', 500_000_000)):
+        count, scalar_time = time_run(invoice_type, total_amount, False)
+        _, batch_time = time_run(invoice_type, total_amount, True)
+        print(f"{invoice_type:>8} {count:>9} {scalar_time:11.3f} {batch_time:10.3f} {scalar_time / batch_time:7.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,103 @@
+"""Benchmark the invoice date allocator against the old list-based lookup.
+
+Usage: python benchmarks/bench_date_slots.py
+
+For each (days, invoices) pair both implementations hand out the same
+number of dates; the output sequences are compared before timings are
+reported, so a mismatch fails loudly instead of producing a fast wrong number.
+"""
+import os
+import sys
+import random
+import time
+from datetime import datetime, timedelta
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from generate_invoices import DateSlotAllocator
+
+CASES = [
+    (31, 100),
+    (365, 1000),
+    (365, 5000),
+    (730, 10000),
+    (1826, 20000),
+    (3652, 200000),
+]
+
+# The legacy path is quadratic, skip it where it would take minutes
+LEGACY_LIMIT = 20000
+
+
+def build_weights(days, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2024, 4, 1)
+    weights = []
+    for offset in range(days):
+        date = start + timedelta(days=offset)
+        weights.append((date, rng.randint(2, 5) if 5 <= date.day <= 25 else rng.randint(1, 3)))
+    return start, weights
+
+
+def run_legacy(start, weights, invoices):
+    available_dates = []
+    for date, weight in weights:
+        available_dates.extend([date] * weight)
+    available_dates.sort()
+
+    last_invoice_date = start
+    result = []
+    for _ in range(invoices):
+        valid_dates = [d for d in available_dates if d >= last_invoice_date]
+        if not valid_dates:
+            result.append(last_invoice_date)
+            continue
+        next_date = valid_dates[0]
+        available_dates.remove(next_date)
+        last_invoice_date = next_date
+        result.append(next_date)
+    return result
+
+
+def run_allocator(start, weights, invoices):
+    slots = DateSlotAllocator()
+    for date, weight in weights:
+        slots.add_day(date, weight)
+
+    last_invoice_date = start
+    result = []
+    for _ in range(invoices):
+        next_date = slots.take()
+        if next_date is not None:
+            last_invoice_date = next_date
+        result.append(last_invoice_date)
+    return result
+
+
+def timed(func, *args):
+    started = time.perf_counter()
+    result = func(*args)
+    return result, time.perf_counter() - started
+
+
+def main():
+    print(f"{'days':>6} {'invoices':>9} {'legacy (s)':>11} {'allocator (s)':>14} {'speedup':>8}")
+    for days, invoices in CASES:
+        start, weights = build_weights(days)
+        new_result, new_time = timed(run_allocator, start, weights, invoices)
+
+        if invoices <= LEGACY_LIMIT:
+            old_result, old_time = timed(run_legacy, start, weights, invoices)
+            if old_result != new_result:
+                raise SystemExit(f"Mismatch for days={days} invoices={invoices}")
+            legacy = f"{old_time:11.4f}"
+            speedup = f"{old_time / new_time:7.0f}x"
+        else:
+            legacy = f"{'skipped':>11}"
+            speedup = f"{'-':>8}"
+
+        print(f"{days:>6} {invoices:>9} {legacy} {new_time:14.4f} {speedup}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,141 @@
+"""Check and time the bulk party-file loader against the original line loop.
+
+Usage: python benchmarks/bench_party_loader.py [parties]
+
+First, the compiled longest-match normalize_party_name and its column form
+normalize_party_names are compared with the original first-match
+startswith loop on random prefix spellings. Next, a
+party file without commas in names or duplicate parties must load to the
+same {normalized name: paise} table as the old per-line split/to_paise loop
+followed by normalize_party_name, and small files (parsed line by line
+without pandas) must load the same as with the column-wise parser. Then a
+file with `parties` lines
+(default one million), including prefix variations, duplicates and names
+containing commas, is loaded with and without a memory map.
+"""
+import os
+import sys
+import time
+import random
+import tempfile
+import contextlib
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from money import to_paise
+from generate_invoices import UNR_PREFIX_VARIATIONS, load_party_file, normalize_party_name, normalize_party_names
+
+PREFIXES = ["", "UNR-", "UNR - ", "unr ", "Unregistered-", "U.N.R ", "U N R-"]
+
+
+def legacy_normalize(name):
+    name = str(name).strip()
+    prefix_variations = [
+        "UNR-", "UNR - ", "UNR ", "UNREGISTERED-", "UNREGISTERED - ",
+        "UNREGISTERED", "UNR_", "UNR_ ", "UNR.", "UNR. ", "U.N.R-",
+        "U.N.R", "U.N.R ", "U N R-", "U N R", "U N R "
+    ]
+    name_upper = name.upper()
+    for prefix in prefix_variations:
+        if name_upper.startswith(prefix):
+            name = name[len(prefix):].strip()
+            break
+    return "UNR-" + name.upper()
+
+
+def check_normalize(names=200000, seed=0):
+    rng = random.Random(seed)
+    pieces = list(UNR_PREFIX_VARIATIONS) + ["", " ", "-", "_", ".", "U", "N", "R", "UN", "REG", "Ram", "unr", "u.n.r"]
+    mismatches = 0
+    samples = []
+    for _ in range(names):
+        name = "".join(rng.choice(pieces) for _ in range(rng.randint(0, 4)))
+        name = "".join(c.lower() if rng.random() < 0.3 else c for c in name)
+        samples.append(name)
+        if legacy_normalize(name) != normalize_party_name(name):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch for {name!r}: {legacy_normalize(name)!r} != {normalize_party_name(name)!r}")
+
+    column = normalize_party_names(pd.Series(samples, dtype=object)).tolist()
+    mismatches += sum(legacy_normalize(name) != normalized for name, normalized in zip(samples, column))
+    return mismatches
+
+
+def legacy_load(path):
+    party_data = {}
+    with open(path, 'r') as f:
+        for line in f:
+            try:
+                if ',' in line:
+                    name, balance = line.strip().split(',')
+                    balance = to_paise(balance.strip())
+                    if balance > 0:
+                        party_data[name.strip()] = balance
+            except ValueError:
+                continue
+    return {legacy_normalize(name): balance for name, balance in party_data.items()}
+
+
+def write_party_file(path, parties, seed, duplicates=True):
+    rng = random.Random(seed)
+    with open(path, 'w') as f:
+        for i in range(parties):
+            if duplicates and i and rng.random() < 0.1:
+                # Same party again, with another prefix spelling
+                number = rng.randrange(i)
+            else:
+                number = i
+            name = f"{rng.choice(PREFIXES)}Farmer {number}"
+            if duplicates and rng.random() < 0.01:
+                name += ", Village Road"
+            f.write(f"{name},{rng.randint(1, 5000000)}.{rng.randint(0, 99):02d}\n")
+
+
+def main():
+    parties = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+
+    if check_normalize():
+        raise SystemExit("Prefix matcher does not match the original startswith loop")
+    print("200000 random prefix spellings: matcher agrees with the startswith loop")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'parties.csv')
+        write_party_file(path, 20000, seed=0, duplicates=False)
+        if legacy_load(path) != load_party_file(path, bulk_lines=0):
+            raise SystemExit("Bulk loader does not match the original line loop")
+        print("20000 distinct parties: bulk loader matches the line loop")
+
+        write_party_file(path, 5000, seed=2)
+        with open(path, 'a') as f:
+            f.write("Bad,abc\nNegative,-5\nZero,0\nExponent,1e3\nTie,0.005\nHuge,12345678901.235\nBlank,\n")
+        with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+            line_by_line = load_party_file(path, bulk_lines=10 ** 9)
+            column_wise = load_party_file(path, bulk_lines=0)
+        if line_by_line != column_wise:
+            raise SystemExit("Line-by-line and column-wise party parsing disagree")
+        print("5000 lines with duplicates and odd balances: line-by-line and column-wise parsing agree")
+
+        write_party_file(path, parties, seed=1)
+        size_mb = os.path.getsize(path) / (1024 * 1024)
+        print(f"\n{parties} lines ({size_mb:.1f} MB)")
+
+        started = time.perf_counter()
+        legacy_count = len(legacy_load(path))
+        legacy_time = time.perf_counter() - started
+        print(f"{'line loop':>14} {legacy_time:7.3f}s  {parties / legacy_time:>10.0f} lines/s  {legacy_count} parties (duplicates overwritten)")
+
+        for use_mmap in (False, True):
+            normalize_party_name.cache_clear()
+            with open(os.devnull, 'w') as devnull, contextlib.redirect_stderr(devnull):
+                started = time.perf_counter()
+                count = len(load_party_file(path, use_mmap=use_mmap))
+                seconds = time.perf_counter() - started
+            label = 'bulk + mmap' if use_mmap else 'bulk'
+            print(f"{label:>14} {seconds:7.3f}s  {parties / seconds:>10.0f} lines/s  {count} parties (duplicates summed)")
+
+
+if __name__ == '__main__':
+    main()
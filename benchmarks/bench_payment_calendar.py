@@ -0,0 +1,132 @@
+"""Check and time payment scheduling with per-party caps, a total daily cap and holidays.
+
+Usage: python benchmarks/bench_payment_calendar.py [invoices]
+
+`stepping_schedule` is the plain day-by-day loop the calendar rules
+describe: invoices are paid oldest first across all parties (equal dates
+in party order, then input order), each party continues from the day its
+previous payments reached, and each day pays the least of what is left,
+the party's room and the total room, skipping blocked days. Random
+voucher sets with random party overrides, holidays and total caps (from
+tighter than one party's cap to never binding) must give identical frames
+from `schedule_payments`. Then a crowded ledger, where the total cap keeps
+every day full for months, is timed with both.
+"""
+import os
+import sys
+import time
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from bench_payments import random_vouchers
+from money import paise_to_rupees
+from payment_calendar import DAILY_PAYMENT_LIMIT, PaymentCalendar
+from process_payments import schedule_payments, voucher_days
+
+EPOCH = date(1970, 1, 1)
+
+
+def stepping_schedule(df, calendar):
+    df = df.sort_values(['Party Name', 'Date'], kind='stable').reset_index(drop=True)
+    days = voucher_days(df).tolist()
+    blocked = set(calendar.blocked.tolist())
+    total_limit = calendar.total_limit if calendar.total_limit is not None else float('inf')
+    party_paid, total_paid, reached = {}, {}, {}
+    records = []
+    for i in sorted(range(len(df)), key=lambda i: (days[i], i)):
+        party = df.at[i, 'Party Name']
+        limit = calendar.party_limits.get(party, calendar.daily_limit)
+        remaining = int(df.at[i, 'Amount Paise'])
+        payment_day = max(days[i], reached.get(party, days[i]))
+        while remaining > 0:
+            if payment_day not in blocked:
+                room = min(limit - party_paid.get((party, payment_day), 0), total_limit - total_paid.get(payment_day, 0))
+                payment = min(remaining, room)
+                if payment > 0:
+                    party_paid[(party, payment_day)] = party_paid.get((party, payment_day), 0) + payment
+                    total_paid[payment_day] = total_paid.get(payment_day, 0) + payment
+                    remaining -= payment
+                    records.append((i, payment_day, payment))
+                    reached[party] = payment_day
+            if remaining > 0:
+                payment_day += 1
+
+    if not records:
+        return pd.DataFrame()
+    records.sort(key=lambda record: record[0])
+    label = lambda day: (EPOCH + timedelta(days=day)).strftime('%d-%m-%Y')
+    return pd.DataFrame({
+        'Party Name': [df.at[i, 'Party Name'] for i, _, _ in records],
+        'Invoice Number': [df.at[i, 'Bill'] for i, _, _ in records],
+        'Invoice Date': [label(days[i]) for i, _, _ in records],
+        'Invoice Amount': [paise_to_rupees(int(df.at[i, 'Amount Paise'])) for i, _, _ in records],
+        'Payment Date': [label(day) for _, day, _ in records],
+        'Payment Amount': [paise_to_rupees(payment) for _, _, payment in records],
+    })
+
+
+def random_calendar(rng, parties, start):
+    party_limits = {
+        f"P{p}": rng.choice([550000, 1000000, 3500000])
+        for p in range(parties) if rng.random() < 0.3
+    }
+    total_limit = rng.choice([None, None, 777700, DAILY_PAYMENT_LIMIT, 3 * DAILY_PAYMENT_LIMIT, 10 ** 12])
+    first = (start - EPOCH).days
+    blocked = [first + rng.randint(-3, 400) for _ in range(rng.choice([0, 5, 60]))]
+    return PaymentCalendar(rng.choice([DAILY_PAYMENT_LIMIT, 150000]), party_limits, total_limit, blocked)
+
+
+def check_equivalence(cases=200, seed=0):
+    rng = random.Random(seed)
+    mismatches = 0
+    for case in range(cases):
+        parties = rng.randint(1, 12)
+        frame = random_vouchers(rng, rng.randint(1, 200), parties, rng.choice([0, 3, 30, 365]))
+        calendar = random_calendar(rng, parties, date(2024, 4, 1))
+        expected = stepping_schedule(frame, calendar)
+        actual = schedule_payments(frame, calendar)
+        if not expected.equals(actual):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch in case {case}:\n{expected.compare(actual) if expected.shape == actual.shape else actual}")
+    print(f"{cases} random voucher sets and calendars checked, {mismatches} mismatches")
+    return mismatches
+
+
+def main():
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 5000
+    if check_equivalence():
+        raise SystemExit("Calendar scheduling does not match the day-by-day loop")
+
+    frame = random_vouchers(random.Random(1), invoices, max(1, invoices // 20), 30)
+    # Sundays off, and a total cap well under what the parties could pay
+    blocked = [day for day in range(19814, 19814 + 4000) if (day + 3) % 7 == 6]
+    calendar = PaymentCalendar(total_limit=10 * DAILY_PAYMENT_LIMIT, blocked_days=blocked)
+
+    started = time.perf_counter()
+    stepping_rows = len(stepping_schedule(frame, calendar))
+    stepping_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    result = schedule_payments(frame, calendar)
+    indexed_time = time.perf_counter() - started
+    assert len(result) == stepping_rows
+
+    calendar = PaymentCalendar(blocked_days=blocked)
+    started = time.perf_counter()
+    uncapped_rows = len(schedule_payments(frame, calendar))
+    uncapped_time = time.perf_counter() - started
+
+    print(f"\n{invoices} invoices over 30 days, total cap {paise_to_rupees(10 * DAILY_PAYMENT_LIMIT):.0f}/day, Sundays off: "
+          f"{stepping_rows} payments until {result['Payment Date'].iloc[-1]}")
+    print(f"day-by-day loop {stepping_time:.3f}s, next-free-day index {indexed_time:.3f}s "
+          f"({stepping_time / indexed_time:.1f}x)")
+    print(f"without the total cap (vectorized): {uncapped_rows} payments in {uncapped_time:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
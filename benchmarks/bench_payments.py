@@ -0,0 +1,121 @@
+"""Check and time the columnar payment scheduler against the original loop.
+
+Usage: python benchmarks/bench_payments.py [invoices]
+
+`legacy_schedule` is the per-invoice iterrows / day-by-day loop that
+`schedule_payments` replaced, with one change: each party's invoices are
+sorted stably, so invoices sharing a date are paid in input order (the old
+quicksort left their order unspecified). Random voucher sets, including
+zero and negative amounts, exact multiples of the daily limit and many
+invoices on the same day, must produce identical frames, both from
+`schedule_payments` and from `schedule_payments_parallel`.
+"""
+import os
+import sys
+import time
+import random
+from datetime import date, timedelta
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+from money import to_paise_array, paise_to_rupees
+from payment_calendar import DAILY_PAYMENT_LIMIT
+from process_payments import schedule_payments, schedule_payments_parallel
+
+
+def legacy_schedule(df, daily_limit=DAILY_PAYMENT_LIMIT):
+    payment_records = []
+    for party_name, party_invoices in df.groupby('Party Name'):
+        party_invoices = party_invoices.sort_values('Date', kind='stable')
+        daily_payments = {}
+        for _, invoice in party_invoices.iterrows():
+            invoice_date = invoice['Date']
+            invoice_amount = int(invoice['Amount Paise'])
+            payment_date = invoice_date
+            remaining_amount = invoice_amount
+            while remaining_amount > 0:
+                if payment_date not in daily_payments:
+                    daily_payments[payment_date] = 0
+                payment_amount = min(remaining_amount, daily_limit - daily_payments[payment_date])
+                if payment_amount > 0:
+                    daily_payments[payment_date] += payment_amount
+                    remaining_amount -= payment_amount
+                    payment_records.append({
+                        'Party Name': party_name,
+                        'Invoice Number': invoice['Bill'],
+                        'Invoice Date': invoice_date.strftime('%d-%m-%Y'),
+                        'Invoice Amount': paise_to_rupees(invoice_amount),
+                        'Payment Date': payment_date.strftime('%d-%m-%Y'),
+                        'Payment Amount': paise_to_rupees(payment_amount)
+                    })
+                if remaining_amount > 0:
+                    payment_date = payment_date + timedelta(days=1)
+    return pd.DataFrame(payment_records)
+
+
+def random_vouchers(rng, invoices, parties, days):
+    start = date(2024, 4, 1)
+    amounts = [
+        lambda: round(rng.uniform(0.01, 90000), 2),
+        lambda: rng.randint(1, 9) * 20000,
+        lambda: rng.choice([0, -150.25, 0.01, 19999.99, 20000.01]),
+    ]
+    frame = pd.DataFrame({
+        'Date': [start + timedelta(days=rng.randint(0, days)) for _ in range(invoices)],
+        'Bill': [f"B{i}" for i in range(invoices)],
+        'Party Name': [f"P{rng.randrange(parties)}" for _ in range(invoices)],
+        'Amount': [rng.choice(amounts)() for _ in range(invoices)],
+    })
+    frame['Date'] = pd.to_datetime(frame['Date'])
+    frame['Amount Paise'] = to_paise_array(frame['Amount'])
+    return frame
+
+
+def check_equivalence(cases=200, seed=0):
+    rng = random.Random(seed)
+    mismatches = 0
+    for case in range(cases):
+        frame = random_vouchers(rng, rng.randint(1, 300), rng.randint(1, 12), rng.choice([0, 3, 30, 365]))
+        expected = legacy_schedule(frame)
+        actual = schedule_payments(frame)
+        if case % 20 == 0:
+            # Spinning up a pool is slow, so only some cases also check the parallel path
+            parallel = schedule_payments_parallel(frame, 3)
+            actual = actual if parallel.equals(actual) else parallel
+        if not expected.equals(actual):
+            mismatches += 1
+            if mismatches <= 5:
+                print(f"Mismatch in case {case}:\n{expected.compare(actual) if expected.shape == actual.shape else actual}")
+    print(f"{cases} random voucher sets checked, {mismatches} mismatches")
+    return mismatches
+
+
+def main():
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    if check_equivalence():
+        raise SystemExit("Columnar scheduler does not match the original loop")
+
+    frame = random_vouchers(random.Random(1), invoices, max(1, invoices // 20), 364)
+
+    started = time.perf_counter()
+    legacy_rows = len(legacy_schedule(frame))
+    legacy_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    rows = len(schedule_payments(frame))
+    columnar_time = time.perf_counter() - started
+
+    started = time.perf_counter()
+    parallel_rows = len(schedule_payments_parallel(frame, os.cpu_count() or 1))
+    parallel_time = time.perf_counter() - started
+
+    assert rows == legacy_rows == parallel_rows
+    print(f"\n{invoices} invoices, {rows} payments: loop {legacy_time:.3f}s, "
+          f"columnar {columnar_time:.3f}s ({legacy_time / columnar_time:.1f}x), "
+          f"{os.cpu_count()} workers {parallel_time:.3f}s")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,145 @@
+"""Check and time the one-process invoice-to-payment pipeline against the two-step CSV route.
+
+Usage: python benchmarks/bench_pipeline.py [invoices]
+
+The two-step route is what the API does today: generate_invoices.py writes
+invoice CSV, the invoices are reshaped into Date/Bill/Party Name/Amount
+vouchers, and process_payments.py parses that CSV and schedules it. The
+pipeline must write the same invoice CSV and the same payment schedule
+for purchase, sales and cross-financial-year runs. Both routes run in
+this process here, so the timings leave out the second interpreter start
+the two-step route also pays. The `--rollups` and `--payment-rollups`
+side outputs must agree with totals re-aggregated from the two CSV files.
+A `--save-state` run must write its state file, and a `--resume` run from
+it must carry on the invoice numbering.
+"""
+import io
+import os
+import sys
+import csv
+import json
+import time
+import tempfile
+
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'scripts'))
+
+import generate_invoices
+import invoice_pipeline
+from process_payments import write_payment_schedule
+
+# Mean purchase invoice is a little over Rs. 34000 once party leftovers are counted
+AMOUNT_PER_INVOICE = 37000
+
+CASES = [
+    ['2024-04-01', '2025-03-31', '1', '--generate', '4500000', '200000', 'PADDY', '22', '23', '2.25', '2.65', 'purchase'],
+    ['2024-01-01', '2024-05-31', '1', '--generate', '3000000', '200000', 'PADDY', '22', '23', '2.25', '2.65', 'purchase'],
+    ['2024-04-01', '2024-04-30', '662', '--generate', '450000', '200000', 'PADDY', '22.5', '23.65', '0', '0', 'sales'],
+]
+
+
+def two_step(argv):
+    invoices = io.StringIO()
+    generate_invoices.run(['generate_invoices.py'] + argv, invoices)
+
+    vouchers = io.StringIO()
+    writer = csv.writer(vouchers, lineterminator='\n')
+    writer.writerow(['Date', 'Bill', 'Party Name', 'Amount'])
+    for row in csv.DictReader(io.StringIO(invoices.getvalue())):
+        writer.writerow([row['Invoice Date'], row['Invoice No'], row['Party Name'], row['Invoice Value (Rs.)']])
+
+    payments = io.StringIO()
+    write_payment_schedule(vouchers.getvalue(), payments)
+    return invoices.getvalue(), payments.getvalue()
+
+
+def pipeline(argv, tmp):
+    path = os.path.join(tmp, 'payments.csv')
+    invoices = io.StringIO()
+    invoice_pipeline.run(['invoice_pipeline.py'] + argv + ['--payments', path], invoices)
+    with open(path, newline='') as f:
+        return invoices.getvalue(), f.read()
+
+
+def check_rollups(argv, tmp):
+    """Rollup totals from one pipeline run, compared with the same totals re-aggregated from its output."""
+    paths = [os.path.join(tmp, name) for name in ('payments.csv', 'invoices.json', 'payments.json')]
+    invoices = io.StringIO()
+    invoice_pipeline.run(['invoice_pipeline.py'] + argv + ['--payments', paths[0], '--rollups', paths[1], '--payment-rollups', paths[2]], invoices)
+    invoice_rollups, payment_rollups = (json.load(open(path)) for path in paths[1:])
+
+    frame = pd.read_csv(io.StringIO(invoices.getvalue()))
+    frame['month'] = pd.to_datetime(frame['Invoice Date'], format='%d-%m-%Y').dt.strftime('%Y-%m')
+    payments = pd.read_csv(paths[0])
+    expected = {
+        'invoices': len(frame),
+        'value': round(frame['Invoice Value (Rs.)'].sum(), 2),
+        'months': frame.groupby('month')['Invoice Value (Rs.)'].sum().round(2).to_dict(),
+        'parties': frame.groupby('Party Name').size().to_dict(),
+        'paid': round(payments['Payment Amount'].sum(), 2),
+        'days': payments.groupby('Payment Date')['Payment Amount'].sum().round(2).to_dict(),
+    }
+    actual = {
+        'invoices': invoice_rollups['totals']['invoices'],
+        'value': invoice_rollups['totals']['value'],
+        'months': {month['month']: month['value'] for month in invoice_rollups['months']},
+        'parties': {party['party']: party['invoices'] for party in invoice_rollups['parties'] if party['invoices']},
+        'paid': payment_rollups['totals']['paid'],
+        'days': {day['date']: day['paid'] for day in payment_rollups['days']},
+    }
+    balanced = invoice_rollups['reconciliation']['balanced'] and payment_rollups['reconciliation']['balanced']
+    return expected == actual and balanced
+
+
+def check_resume(tmp):
+    """Whether a run resumed from `--save-state` numbers its invoices on from the saved run."""
+    path = os.path.join(tmp, 'state.json')
+    april = io.StringIO()
+    generate_invoices.run(['generate_invoices.py', '2024-04-01', '2024-04-30'] + CASES[0][2:] + ['--seed', '1', '--save-state', path], april)
+    if not os.path.exists(path):
+        return False
+    may = io.StringIO()
+    generate_invoices.run(['generate_invoices.py', '2024-05-01', '2024-05-31'] + CASES[0][2:] + ['--resume', path], may)
+
+    numbers = [
+        [int(row['Invoice No'].rsplit('-', 1)[1]) for row in csv.DictReader(io.StringIO(out.getvalue()))]
+        for out in (april, may)
+    ]
+    return all(numbers) and min(numbers[1]) == max(numbers[0]) + 1
+
+
+def main():
+    invoices = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+
+    with tempfile.TemporaryDirectory() as tmp:
+        for case in CASES:
+            argv = case + ['--seed', '1']
+            if two_step(argv) != pipeline(argv, tmp):
+                raise SystemExit(f"Pipeline output differs from the two-step route for: {' '.join(case)}")
+        print(f"{len(CASES)} runs: pipeline writes the same invoices and payments as the two-step route")
+
+        for case in CASES:
+            if not check_rollups(case + ['--seed', '1'], tmp):
+                raise SystemExit(f"Rollups differ from re-aggregated output for: {' '.join(case)}")
+        print(f"{len(CASES)} runs: rollups match totals re-aggregated from the output files")
+
+        if not check_resume(tmp):
+            raise SystemExit("--save-state/--resume does not continue the invoice series")
+        print("--save-state then --resume: the resumed run continues the invoice numbering")
+
+        argv = CASES[0][:4] + [str(invoices * AMOUNT_PER_INVOICE)] + CASES[0][5:] + ['--seed', '1', '--vectorized']
+        started = time.perf_counter()
+        rows = two_step(argv)[1].count('\n')
+        two_step_time = time.perf_counter() - started
+
+        started = time.perf_counter()
+        pipeline(argv, tmp)
+        pipeline_time = time.perf_counter() - started
+
+    print(f"\n~{invoices} invoices, {rows} payment lines: two-step {two_step_time:.3f}s, "
+          f"pipeline {pipeline_time:.3f}s ({two_step_time / pipeline_time:.2f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,214 @@
+"""Benchmark suite for the invoice and payment scripts.
+
+Usage:
+    python benchmarks/run_benchmarks.py [--sizes 1000,100000,1000000]
+                                        [--output benchmarks/results.jsonl]
+                                        [--cases generate,generate-vectorized,payments,startup]
+
+Every case runs in a fresh subprocess with a fixed seed, so timings are
+comparable between runs and peak RSS belongs to that case alone. One JSON
+record per suite run is appended to the output file, so regressions can be
+tracked over time by diffing records.
+"""
+import os
+import sys
+import json
+import time
+import random
+import platform
+import resource
+import statistics
+import subprocess
+from datetime import date, datetime, timedelta, timezone
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+SCRIPTS = os.path.join(ROOT, 'scripts')
+
+DEFAULT_SIZES = [1000, 100000, 1000000]
+DEFAULT_CASES = ['generate', 'generate-vectorized', 'payments', 'startup']
+DEFAULT_OUTPUT = os.path.join(ROOT, 'benchmarks', 'results.jsonl')
+SEED = 1
+
+# Mean purchase invoice is a little over Rs. 34000 once party leftovers are
+# counted, so this total yields roughly `size` invoices
+AMOUNT_PER_INVOICE = 37000
+
+STARTUP_RUNS = 5
+
+# Imports a plain CSV generation run must not pay for
+HEAVY_MODULES = ['pandas', 'numpy', 'pyarrow']
+
+
+class CountingSink:
+    """Write target that only counts output lines, so disk speed does not skew timings."""
+
+    def __init__(self):
+        self.lines = 0
+
+    def write(self, data):
+        self.lines += data.count('\n')
+        return len(data)
+
+    def flush(self):
+        pass
+
+
+def synthetic_vouchers(size):
+    """Voucher CSV text (Date, Bill, Party Name, Amount) with `size` invoices."""
+    rng = random.Random(SEED)
+    parties = [f"UNR-PARTY {i}" for i in range(max(1, size // 20))]
+    start = date(2024, 4, 1)
+    lines = ["Date,Bill,Party Name,Amount"]
+    for i in range(size):
+        invoice_date = start + timedelta(days=rng.randint(0, 364))
+        amount = rng.randint(2000000, 4800000) / 100
+        lines.append(f"{invoice_date:%d-%m-%Y},B{i},{rng.choice(parties)},{amount}")
+    return "\n".join(lines) + "\n"
+
+
+def run_case(case, size):
+    """Child process body: run one case and print its measurements as JSON."""
+    sys.path.insert(0, SCRIPTS)
+    from run_metrics import peak_rss_mb
+
+    if case in ('generate', 'generate-vectorized'):
+        import generate_invoices
+
+        argv = [
+            'generate_invoices.py', '2024-04-01', '2025-03-31', '1', '--generate',
+            str(size * AMOUNT_PER_INVOICE), '200000', 'PADDY', '22', '23', '2.25', '2.65',
+            'purchase', '--seed', str(SEED),
+        ]
+        if case == 'generate-vectorized':
+            argv.append('--vectorized')
+
+        sink = CountingSink()
+        started, started_cpu = time.perf_counter(), time.process_time()
+        generate_invoices.run(argv, sink)
+        rows = sink.lines - 1
+    elif case == 'payments':
+        import process_payments
+
+        csv_data = synthetic_vouchers(size)
+        sink = CountingSink()
+        started, started_cpu = time.perf_counter(), time.process_time()
+        process_payments.write_payment_schedule(csv_data, sink)
+        rows = size
+    else:
+        raise ValueError(f"Unknown case: {case}")
+
+    seconds = time.perf_counter() - started
+    cpu_seconds = time.process_time() - started_cpu
+    print(json.dumps({
+        "case": case,
+        "size": size,
+        "rows": rows,
+        "seconds": round(seconds, 4),
+        "cpu_seconds": round(cpu_seconds, 4),
+        "rows_per_second": round(rows / seconds, 1) if seconds else None,
+        "peak_rss_mb": round(peak_rss_mb(resource.RUSAGE_SELF), 1),
+    }))
+
+
+def measure_case(case, size):
+    result = subprocess.run(
+        [sys.executable, os.path.abspath(__file__), '--child', case, str(size)],
+        capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        return {"case": case, "size": size, "error": result.stderr.strip().splitlines()[-1:]}
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def measure_startup():
+    """Wall time of a minimal end-to-end generate_invoices.py run (one sales invoice).
+
+    Also records which HEAVY_MODULES such a run imported; the list should
+    stay empty, since they cost more than the run itself.
+    """
+    args = [
+        '2024-04-01', '2024-04-01', '1', '--generate', '20000', '20000', 'PADDY',
+        '22', '23', '0', '0', 'sales', '--seed', str(SEED),
+    ]
+    command = [sys.executable, os.path.join(SCRIPTS, 'generate_invoices.py')] + args
+    timings = []
+    for _ in range(STARTUP_RUNS):
+        started = time.perf_counter()
+        subprocess.run(command, capture_output=True, check=True)
+        timings.append(time.perf_counter() - started)
+
+    check = (
+        f"import io, sys; sys.path.insert(0, {SCRIPTS!r}); import generate_invoices; "
+        f"generate_invoices.run({['generate_invoices.py'] + args!r}, io.StringIO()); "
+        f"print(','.join(name for name in {HEAVY_MODULES!r} if name in sys.modules))"
+    )
+    imported = subprocess.run([sys.executable, '-c', check], capture_output=True, text=True, check=True).stdout.strip()
+    return {
+        "case": "startup",
+        "runs": STARTUP_RUNS,
+        "min_seconds": round(min(timings), 4),
+        "median_seconds": round(statistics.median(timings), 4),
+        "heavy_imports": imported.split(',') if imported else [],
+    }
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def parse_list(argv, name, default, cast=str):
+    if name in argv:
+        return [cast(item) for item in argv[argv.index(name) + 1].split(',') if item]
+    return default
+
+
+def main(argv):
+    if argv[1:2] == ['--child']:
+        run_case(argv[2], int(argv[3]))
+        return
+
+    sizes = parse_list(argv, '--sizes', DEFAULT_SIZES, int)
+    cases = parse_list(argv, '--cases', DEFAULT_CASES)
+    output = argv[argv.index('--output') + 1] if '--output' in argv else DEFAULT_OUTPUT
+
+    results = []
+    for case in cases:
+        if case == 'startup':
+            result = measure_startup()
+            print(
+                f"{'startup':<22} median {result['median_seconds']:.3f}s  min {result['min_seconds']:.3f}s  "
+                f"heavy imports: {', '.join(result['heavy_imports']) or 'none'}"
+            )
+            results.append(result)
+            continue
+        for size in sizes:
+            result = measure_case(case, size)
+            results.append(result)
+            if "error" in result:
+                print(f"{case:<22} {size:>9}  failed: {result['error']}")
+            else:
+                print(
+                    f"{case:<22} {size:>9}  {result['rows']:>9} rows  {result['seconds']:8.3f}s  "
+                    f"{result['rows_per_second']:>10.0f} rows/s  {result['peak_rss_mb']:8.1f} MB"
+                )
+
+    record = {
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "seed": SEED,
+        "results": results,
+    }
+    with open(output, 'a') as f:
+        f.write(json.dumps(record) + "\n")
+    print(f"Results appended to {output}")
+
+
+if __name__ == '__main__':
+    main(sys.argv)
@@ -47,6 +47,10 @@ const baseSchema = {
     .string()
     .transform((val) => parseFloat(val))
     .refine((val) => !isNaN(val) && val >= 0, "Must be a non-negative number"),
+  seed: z
+    .string()
+    .optional()
+    .refine((val) => !val || /^\d+$/.test(val), "Must be a non-negative whole number"),
   dataEntryMode: z.enum(["manual", "generate"]),
   invoiceType: z.enum(["purchase", "sales"]).default("purchase"),
 };
@@ -172,6 +176,7 @@ export default function InvoiceForm() {
       totalAmount: "",
       partyLimit: "",
       invoiceType: "purchase",
+      seed: "",
     },
   });
 
@@ -494,6 +499,25 @@ export default function InvoiceForm() {
               )}
             </div>
 
+            <div className="space-y-2.5">
+              <Label className="text-sm font-medium" htmlFor="seed">
+                Seed (optional)
+              </Label>
+              <Input
+                id="seed"
+                type="number"
+                min="0"
+                placeholder="Same seed, same invoices"
+                className="font-medium"
+                {...register("seed")}
+              />
+              {errors.seed && (
+                <p className="text-sm font-medium text-destructive mt-1.5">
+                  {errors.seed.message}
+                </p>
+              )}
+            </div>
+
             <div className="space-y-2.5">
               <Label className="text-sm font-medium" htmlFor="minPurchaseRate">
                 Minimum {invoiceType === "sales" ? "Sales" : "Purchase"} Rate
@@ -0,0 +1,219 @@
+import { spawn } from "child_process";
+import { mkdirSync } from "fs";
+import path from "path";
+
+// Keeps a few long-lived `python3 scripts/<name>.py --worker` processes so a
+// request does not pay interpreter startup and the pandas import. See
+// scripts/job_worker.py for the framing protocol spoken over stdin/stdout.
+
+const DEFAULT_POOL_SIZE = 2;
+// Jobs in flight per worker; matches DEFAULT_QUEUE_SIZE in job_worker.py,
+// which rejects jobs beyond its queue. Further jobs wait in the pool.
+const DEFAULT_QUEUE_SIZE = 8;
+// Python's reply when its queue is full; such jobs are retried, not failed
+const QUEUE_FULL_MESSAGE = "Worker queue is full";
+const QUEUE_FULL_RETRY_MS = 50;
+
+class PythonWorker {
+  constructor(scriptPath, pythonPath, queueSize, onExit) {
+    this.jobs = new Map();
+    this.buffer = Buffer.alloc(0);
+    this.pendingHeader = null;
+    this.dead = false;
+    this.onExit = onExit;
+    this.process = spawn(pythonPath, [scriptPath, "--worker", "--queue-size", String(queueSize)]);
+
+    this.process.stdout.on("data", (chunk) => this.handleStdout(chunk));
+    this.process.stderr.on("data", (data) => {
+      console.error("Python worker stderr:", data.toString());
+    });
+    this.process.on("error", (error) => {
+      console.error("Failed to start Python worker:", error);
+      this.retire(new Error(`Failed to start Python process: ${error.message}`));
+    });
+    // EPIPE when the worker exits while a job is being written to it
+    this.process.stdin.on("error", (error) => {
+      console.error("Python worker stdin error:", error.message);
+      this.retire(new Error(`Python worker stopped accepting jobs: ${error.message}`));
+    });
+    this.process.on("close", (code) => {
+      this.retire(new Error(`Python worker exited with code ${code}`));
+    });
+  }
+
+  // Fail this worker's jobs and take it out of the pool, which replaces it
+  retire(error) {
+    this.fail(error);
+    if (!this.dead) {
+      this.dead = true;
+      this.onExit(this);
+    }
+  }
+
+  get load() {
+    return this.jobs.size;
+  }
+
+  run(id, job, onData) {
+    return new Promise((resolve, reject) => {
+      this.jobs.set(id, { onData, resolve, reject });
+      this.process.stdin.write(JSON.stringify({ ...job, id }) + "\n");
+    });
+  }
+
+  handleStdout(chunk) {
+    this.buffer = Buffer.concat([this.buffer, chunk]);
+
+    while (true) {
+      if (this.pendingHeader) {
+        // Waiting for the payload of a data frame
+        const size = this.pendingHeader.bytes;
+        if (this.buffer.length < size) return;
+        const payload = this.buffer.subarray(0, size);
+        this.buffer = this.buffer.subarray(size);
+        const job = this.jobs.get(this.pendingHeader.id);
+        this.pendingHeader = null;
+        if (job) {
+          // A failing consumer must not stop frame parsing for the other jobs
+          try {
+            job.onData(payload);
+          } catch (error) {
+            console.error("Python worker output handler failed:", error.message);
+          }
+        }
+        continue;
+      }
+
+      const newline = this.buffer.indexOf(10);
+      if (newline === -1) return;
+      const header = JSON.parse(this.buffer.subarray(0, newline).toString());
+      this.buffer = this.buffer.subarray(newline + 1);
+
+      if (header.event === "data") {
+        this.pendingHeader = header;
+        continue;
+      }
+
+      const job = this.jobs.get(header.id);
+      if (!job) {
+        console.error("Python worker error:", header.message);
+        continue;
+      }
+      this.jobs.delete(header.id);
+      if (header.event === "end") {
+        job.resolve();
+      } else {
+        const error = new Error(header.message || "Unknown error occurred");
+        error.retryable = header.message === QUEUE_FULL_MESSAGE;
+        job.reject(error);
+      }
+    }
+  }
+
+  fail(error) {
+    for (const job of this.jobs.values()) {
+      job.reject(error);
+    }
+    this.jobs.clear();
+  }
+}
+
+class PythonWorkerPool {
+  constructor(scriptName, { size, pythonPath, queueSize } = {}) {
+    this.scriptPath = path.join(process.cwd(), "scripts", scriptName);
+    this.pythonPath = pythonPath || process.env.PYTHON_PATH || "python3";
+    this.size = size || DEFAULT_POOL_SIZE;
+    this.queueSize = queueSize || DEFAULT_QUEUE_SIZE;
+    this.workers = [];
+    // Jobs waiting for a worker with room, oldest first
+    this.waiting = [];
+    this.nextJobId = 1;
+  }
+
+  // A worker with room for another job, or null when all are full
+  acquire() {
+    if (this.workers.length < this.size) {
+      const worker = new PythonWorker(this.scriptPath, this.pythonPath, this.queueSize, (dead) => {
+        this.workers = this.workers.filter((w) => w !== dead);
+      });
+      this.workers.push(worker);
+      return worker;
+    }
+    // Least busy worker first
+    const best = this.workers.reduce((best, w) => (w.load < best.load ? w : best));
+    return best.load < this.queueSize ? best : null;
+  }
+
+  // Start waiting jobs while any worker has room
+  dispatch() {
+    while (this.waiting.length) {
+      const worker = this.acquire();
+      if (!worker) return;
+      const entry = this.waiting.shift();
+      worker.run(entry.id, entry.job, entry.onData).then(
+        () => {
+          entry.resolve();
+          this.dispatch();
+        },
+        (error) => {
+          if (error.retryable) {
+            // The worker was busier than counted; try again shortly
+            this.waiting.unshift(entry);
+            setTimeout(() => this.dispatch(), QUEUE_FULL_RETRY_MS);
+            return;
+          }
+          entry.reject(error);
+          this.dispatch();
+        }
+      );
+    }
+  }
+
+  /**
+   * Run one job on a warm worker. `onData` receives each chunk of output as
+   * it arrives; without it the chunks are collected and returned as a Buffer.
+   * With every worker at its queue size, the job waits here for a free slot.
+   */
+  async run(job, onData) {
+    const chunks = [];
+    const id = String(this.nextJobId++);
+    await new Promise((resolve, reject) => {
+      this.waiting.push({ id, job, onData: onData || ((chunk) => chunks.push(chunk)), resolve, reject });
+      this.dispatch();
+    });
+    return onData ? null : Buffer.concat(chunks);
+  }
+}
+
+/**
+ * Extra script arguments for per-request diagnostics. With PYTHON_METRICS
+ * set, scripts print per-stage timings as JSON on stderr, which the worker
+ * logs alongside the request; PYTHON_PROFILE_DIR collects one cProfile file
+ * per request, named after `label`.
+ */
+export function diagnosticArgs(label) {
+  const args = [];
+  if (process.env.PYTHON_METRICS) {
+    args.push("--metrics");
+  }
+  if (process.env.PYTHON_PROFILE_DIR) {
+    mkdirSync(process.env.PYTHON_PROFILE_DIR, { recursive: true });
+    const file = `${label}_${Date.now()}_${Math.random().toString(36).slice(2, 8)}.prof`;
+    args.push("--profile", path.join(process.env.PYTHON_PROFILE_DIR, file));
+  }
+  return args;
+}
+
+export function getWorkerPool(scriptName) {
+  // Survive Next.js module reloads in development
+  const pools = (globalThis.__pythonWorkerPools ||= new Map());
+  if (!pools.has(scriptName)) {
+    pools.set(
+      scriptName,
+      new PythonWorkerPool(scriptName, {
+        size: parseInt(process.env.PYTHON_WORKERS, 10) || DEFAULT_POOL_SIZE,
+      })
+    );
+  }
+  return pools.get(scriptName);
+}
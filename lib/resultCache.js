@@ -0,0 +1,168 @@
+import { createHash } from "crypto";
+import { promisify } from "util";
+import zlib from "zlib";
+import fs from "fs/promises";
+import { readdirSync, readFileSync } from "fs";
+import os from "os";
+import path from "path";
+
+// Gzipped script output on disk, addressed by a SHA-256 of the job spec, the
+// job's input and the Python sources, so identical requests are answered
+// without running a script and a deploy with changed scripts never serves
+// stale results. Least recently used entries are evicted past the size limit.
+
+const gzip = promisify(zlib.gzip);
+const gunzip = promisify(zlib.gunzip);
+
+const DEFAULT_MAX_MB = 256;
+const ENTRY_SUFFIX = ".gz";
+
+// Hash of every scripts/*.py file, computed once per process
+let scriptsDigest = null;
+
+function getScriptsDigest() {
+  if (scriptsDigest === null) {
+    const scriptsDir = path.join(process.cwd(), "scripts");
+    const hash = createHash("sha256");
+    for (const name of readdirSync(scriptsDir).filter((n) => n.endsWith(".py")).sort()) {
+      hash.update(name).update("\0").update(readFileSync(path.join(scriptsDir, name)));
+    }
+    scriptsDigest = hash.digest("hex");
+  }
+  return scriptsDigest;
+}
+
+// JSON with object keys sorted, so equal specs always hash the same
+function canonicalJson(value) {
+  if (Array.isArray(value)) {
+    return `[${value.map(canonicalJson).join(",")}]`;
+  }
+  if (value && typeof value === "object") {
+    const keys = Object.keys(value).filter((k) => value[k] !== undefined).sort();
+    return `{${keys.map((k) => `${JSON.stringify(k)}:${canonicalJson(value[k])}`).join(",")}}`;
+  }
+  return JSON.stringify(value);
+}
+
+class ResultCache {
+  constructor({ dir, maxBytes }) {
+    this.dir = dir;
+    this.maxBytes = maxBytes;
+    // key -> compressed size, oldest use first
+    this.entries = null;
+    this.totalBytes = 0;
+    this.stats = { hits: 0, misses: 0, stores: 0, evictions: 0 };
+  }
+
+  /** Cache key for a job spec (any JSON value) and its input (string or Buffer). */
+  key(spec, input = "") {
+    return createHash("sha256")
+      .update(getScriptsDigest())
+      .update("\0")
+      .update(canonicalJson(spec))
+      .update("\0")
+      .update(input)
+      .digest("hex");
+  }
+
+  entryPath(key) {
+    return path.join(this.dir, key + ENTRY_SUFFIX);
+  }
+
+  async load() {
+    if (this.entries) return;
+    await fs.mkdir(this.dir, { recursive: true });
+    // Entries left by earlier processes, least recently used first
+    const files = [];
+    for (const name of await fs.readdir(this.dir)) {
+      if (!name.endsWith(ENTRY_SUFFIX)) continue;
+      const stat = await fs.stat(path.join(this.dir, name)).catch(() => null);
+      if (stat) files.push({ key: name.slice(0, -ENTRY_SUFFIX.length), size: stat.size, used: stat.mtimeMs });
+    }
+    files.sort((a, b) => a.used - b.used);
+    this.entries = new Map(files.map((f) => [f.key, f.size]));
+    this.totalBytes = files.reduce((sum, f) => sum + f.size, 0);
+    await this.evict();
+  }
+
+  /** The stored output for `key` as a Buffer, or null on a miss. */
+  async get(key) {
+    await this.load();
+    if (!this.entries.has(key)) {
+      this.stats.misses++;
+      return null;
+    }
+    try {
+      const output = await gunzip(await fs.readFile(this.entryPath(key)));
+      // Most recently used: last in the map, newest mtime on disk
+      const size = this.entries.get(key);
+      this.entries.delete(key);
+      this.entries.set(key, size);
+      const now = new Date();
+      await fs.utimes(this.entryPath(key), now, now).catch(() => {});
+      this.stats.hits++;
+      return output;
+    } catch (error) {
+      console.error("Result cache read failed:", error.message);
+      await this.remove(key);
+      this.stats.misses++;
+      return null;
+    }
+  }
+
+  /** Store `output` (Buffer) under `key`, evicting old entries past the size limit. */
+  async set(key, output) {
+    await this.load();
+    const compressed = await gzip(output);
+    if (compressed.length > this.maxBytes) return;
+
+    // Write then rename, so readers never see a partial entry
+    const tempPath = `${this.entryPath(key)}.${process.pid}.tmp`;
+    await fs.writeFile(tempPath, compressed);
+    await fs.rename(tempPath, this.entryPath(key));
+
+    this.totalBytes -= this.entries.get(key) || 0;
+    this.entries.delete(key);
+    this.entries.set(key, compressed.length);
+    this.totalBytes += compressed.length;
+    this.stats.stores++;
+    await this.evict();
+  }
+
+  async remove(key) {
+    if (!this.entries.has(key)) return;
+    this.totalBytes -= this.entries.get(key);
+    this.entries.delete(key);
+    await fs.unlink(this.entryPath(key)).catch(() => {});
+  }
+
+  async evict() {
+    for (const key of this.entries.keys()) {
+      if (this.totalBytes <= this.maxBytes) break;
+      await this.remove(key);
+      this.stats.evictions++;
+    }
+  }
+
+  summary() {
+    return { ...this.stats, entries: this.entries ? this.entries.size : 0, bytes: this.totalBytes };
+  }
+}
+
+/**
+ * The shared result cache, or null when RESULT_CACHE_DISABLED is set.
+ * RESULT_CACHE_DIR and RESULT_CACHE_MAX_MB configure where entries live and
+ * how much compressed output is kept.
+ */
+export function getResultCache() {
+  if (process.env.RESULT_CACHE_DISABLED) return null;
+  // Survive Next.js module reloads in development
+  if (!globalThis.__resultCache) {
+    const maxMb = parseFloat(process.env.RESULT_CACHE_MAX_MB) || DEFAULT_MAX_MB;
+    globalThis.__resultCache = new ResultCache({
+      dir: process.env.RESULT_CACHE_DIR || path.join(os.tmpdir(), "invoice-generator-cache"),
+      maxBytes: Math.floor(maxMb * 1024 * 1024),
+    });
+  }
+  return globalThis.__resultCache;
+}
@@ -0,0 +1,29 @@
+"""Helpers for the optional `--flag [value]` arguments shared by the scripts.
+
+The scripts keep their positional argument layout (the API routes depend on
+it), so options are removed from argv first and the positional count checks
+run on what is left.
+"""
+
+
+def pop_flag(argv, name):
+    """Remove a boolean `name` flag from `argv` in place and return whether it was given."""
+    if name in argv:
+        argv.remove(name)
+        return True
+    return False
+
+
+def pop_option(argv, name, default=None, cast=str):
+    """Remove `name VALUE` from `argv` in place and return VALUE converted with `cast`."""
+    if name not in argv:
+        return default
+    idx = argv.index(name)
+    if idx + 1 >= len(argv):
+        raise ValueError(f"{name} requires a value")
+    raw = argv[idx + 1]
+    del argv[idx:idx + 2]
+    try:
+        return cast(raw)
+    except ValueError:
+        raise ValueError(f"Invalid value for {name}: {raw}")
@@ -0,0 +1,137 @@
+"""Parquet and Arrow IPC input/output for the scripts' `--format` option.
+
+CSV stays the default and needs nothing beyond pandas. The binary formats
+use pyarrow, which is imported on first use so the scripts still run
+without it. Columns are typed: dates are date32, and money and other
+two-decimal values are decimal128(18, 2) built straight from integer
+hundredths (see money.py), so no value passes through text or floats.
+NumPy, like pyarrow, is imported on first use.
+"""
+from money import to_paise_array
+
+FORMATS = ('csv', 'parquet', 'arrow')
+
+# Leading bytes of a Parquet file, an Arrow IPC file and an Arrow IPC stream
+_MAGIC = ((b'PAR1', 'parquet'), (b'ARROW1', 'arrow'), (b'\xff\xff\xff\xff', 'arrow-stream'))
+
+
+def output_format(value):
+    """`pop_option` cast for `--format`."""
+    value = value.lower()
+    if value not in FORMATS:
+        raise ValueError(value)
+    return value
+
+
+def import_pyarrow():
+    """Import pyarrow (with its Parquet module) or explain how to get it."""
+    try:
+        import pyarrow
+        import pyarrow.parquet  # noqa: F401
+    except ImportError:
+        raise ValueError("Parquet and Arrow formats need pyarrow: pip install pyarrow")
+    return pyarrow
+
+
+def binary_stream(out):
+    """The byte stream under a text stream like sys.stdout, or `out` itself if it takes bytes."""
+    if hasattr(out, 'buffer'):
+        out.flush()
+        return out.buffer
+    return out
+
+
+def date_array(days):
+    """date32 array from day numbers (days since 1970-01-01)."""
+    import numpy as np
+
+    pa = import_pyarrow()
+    return pa.array(np.asarray(days, dtype=np.int32)).cast(pa.date32())
+
+
+def decimal_array(hundredths):
+    """decimal128(18, 2) array from integer hundredths.
+
+    Decimal128 values are stored as 128-bit two's complement integers of the
+    unscaled value, so the buffer is the int64 values next to their sign
+    words; no Python Decimal objects are created.
+    """
+    import numpy as np
+
+    pa = import_pyarrow()
+    values = np.asarray(hundredths, dtype=np.int64)
+    words = np.empty((len(values), 2), dtype=np.int64)
+    words[:, 0] = values
+    words[:, 1] = values >> 63
+    return pa.Array.from_buffers(pa.decimal128(18, 2), len(values), [None, pa.py_buffer(words)])
+
+
+def hundredths_array(array):
+    """Int64 NumPy array of hundredths from a decimal, integer or float Arrow array (nulls become 0)."""
+    import numpy as np
+
+    pa = import_pyarrow()
+    if isinstance(array, pa.ChunkedArray):
+        array = array.combine_chunks()
+
+    if pa.types.is_decimal128(array.type) and array.type.scale == 2:
+        # Low words of the 128-bit values; two-decimal money always fits in them
+        words = np.frombuffer(array.buffers()[1], dtype=np.int64)
+        values = words[2 * array.offset:2 * (array.offset + len(array)):2].copy()
+    elif pa.types.is_integer(array.type):
+        values = array.fill_null(0).to_numpy().astype(np.int64) * 100
+    else:
+        values = to_paise_array(array.cast(pa.float64()).fill_null(0).to_numpy())
+
+    if array.null_count:
+        values[array.is_null().to_numpy(zero_copy_only=False)] = 0
+    return values
+
+
+def sniff_format(data):
+    """Name of the binary format `data` (bytes) is in, or None for text such as CSV."""
+    for magic, name in _MAGIC:
+        if data.startswith(magic):
+            return name
+    return None
+
+
+def read_table(data):
+    """Load Parquet or Arrow IPC bytes as a pyarrow Table."""
+    pa = import_pyarrow()
+    kind = sniff_format(data)
+    if kind == 'parquet':
+        return pa.parquet.read_table(pa.BufferReader(data))
+    if kind == 'arrow':
+        return pa.ipc.open_file(pa.BufferReader(data)).read_all()
+    if kind == 'arrow-stream':
+        return pa.ipc.open_stream(pa.BufferReader(data)).read_all()
+    raise ValueError("Input is not a Parquet or Arrow file")
+
+
+class TableWriter:
+    """Write pyarrow tables to the byte stream `out` as one Parquet or Arrow IPC file.
+
+    Tables are appended as row groups (Parquet) or record batches (Arrow) as
+    they are written, so output can be produced batch by batch. The schema
+    comes from the first table; `close()` writes the file footer.
+    """
+
+    def __init__(self, out, fmt):
+        self.pa = import_pyarrow()
+        self.sink = self.pa.PythonFile(out, mode='w')
+        self.fmt = fmt
+        self.writer = None
+
+    def write(self, table):
+        if self.writer is None:
+            if self.fmt == 'parquet':
+                self.writer = self.pa.parquet.ParquetWriter(self.sink, table.schema)
+            else:
+                self.writer = self.pa.ipc.new_file(self.sink, table.schema)
+        self.writer.write_table(table)
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+        self.sink.flush()
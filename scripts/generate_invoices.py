@@ -1,10 +1,92 @@
+import os
+import re
 import sys
+import csv
+import mmap
+import functools
 import json
-import pandas as pd
 import random
 from datetime import datetime, timedelta
-from decimal import Decimal, ROUND_HALF_UP
 import traceback
+import heapq
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+
+import job_worker
+from money import (
+    to_paise, round_half_up, div_half_up, round_half_up_array, div_half_up_array,
+    paise_to_rupees, format_hundredths
+)
+from cli_options import pop_flag, pop_option
+from columnar import TableWriter, binary_stream, decimal_array, import_pyarrow, output_format
+from run_metrics import RunMetrics, measured, pop_metrics_options, profiled
+
+SALES_COLUMNS = [
+    "Invoice Date", "Invoice No", "Party Name", "Product", "Quantity (kg)",
+    "Sale Rate (Rs./kg)", "Invoice Value (Rs.)", "Flag"
+]
+
+PURCHASE_COLUMNS = [
+    "Invoice Date", "Invoice No", "Party Name", "Product", "Quantity (kg)",
+    "Pur. Rate (Rs./kg)", "Invoice Value (Rs.)", "Sale Rate (Rs./kg)",
+    "Margin (%)", "Balance Remaining (Rs.)"
+]
+
+# Spellings of the unregistered-party prefix, compared in uppercase. The
+# longest one that starts a name is replaced, so their order does not matter
+STANDARD_PREFIX = "UNR-"
+UNR_PREFIX_VARIATIONS = (
+    "UNR-", "UNR - ", "UNR ", "UNREGISTERED-", "UNREGISTERED - ",
+    "UNREGISTERED", "UNR_", "UNR_ ", "UNR.", "UNR. ", "U.N.R-",
+    "U.N.R", "U.N.R ", "U N R-", "U N R", "U N R "
+)
+# Alternatives are tried in order, so longest first gives the longest match
+UNR_PREFIX = re.compile("|".join(
+    re.escape(prefix) for prefix in sorted(UNR_PREFIX_VARIATIONS, key=len, reverse=True)
+))
+# The same match at the start of every line of a text, with the spaces after it
+UNR_PREFIX_LINES = re.compile(r"^(?:" + UNR_PREFIX.pattern + r")[^\S\n]*", re.MULTILINE)
+
+# Distinct party names remembered by normalize_party_name
+NORMALIZE_CACHE_SIZE = 65536
+
+# Party files with at least this many lines are parsed column-wise with
+# pandas. Smaller ones are parsed line by line, which costs less than
+# importing pandas (about half a second)
+BULK_PARTY_LINES = 100000
+
+# Party file balances at or above this many rupees are parsed with Decimal,
+# since float paise lose exactness
+MAX_FLOAT_RUPEES = 1e9
+
+# Typed columns in --format parquet/arrow output; the rest are strings
+DATE_COLUMNS = {"Invoice Date"}
+INTEGER_COLUMNS = {"Quantity (kg)"}
+HUNDREDTHS_COLUMNS = {
+    "Sale Rate (Rs./kg)", "Pur. Rate (Rs./kg)", "Invoice Value (Rs.)",
+    "Margin (%)", "Balance Remaining (Rs.)"
+}
+
+# Typed hundredths columns written as rupees in CSV; the others are rates and margins
+MONEY_COLUMNS = {"Invoice Value (Rs.)", "Balance Remaining (Rs.)"}
+
+# Rows per Parquet row group / Arrow record batch
+TABLE_BATCH_SIZE = 65536
+
+# Layout of --save-state / --resume files
+STATE_VERSION = 1
+
+# Values of the optional last argument
+INVOICE_TYPES = ('purchase', 'sales')
+
+# Job ids in --batch files become output file names
+BATCH_JOB_ID = re.compile(r"^[A-Za-z0-9][A-Za-z0-9._-]*$")
+
+# Financial year (April-March) position of each invoice number month prefix
+MONTH_ORDER = {
+    "APR": 1, "MAY": 2, "JUN": 3, "JUL": 4, "AUG": 5, "SEP": 6,
+    "OCT": 7, "NOV": 8, "DEC": 9, "JAN": 10, "FEB": 11, "MAR": 12
+}
 
 # def generate_indian_business_name():
 #     """Generate a realistic Indian business name."""
@@ -35,9 +117,8 @@ import traceback
 #         # Format: PREFIX BUSINESS_TYPE
 #         return f"{random.choice( common_prefixes)} {random.choice(business_types)}"
 
-def generate_bihar_farmer_name():
-    """Generate a realistic Bihar farmer name."""
-    first_names = [
+# Name tables are module constants so long-lived workers build them only once
+FIRST_NAMES = [
     'Harinder', 'Vinod', 'Ajay', 'Lalan', 'Madan', 'Manish', 'Ramesh',
     'Suresh', 'Dinesh', 'Rajesh', 'Sanjay', 'Naveen', 'Ashok', 'Vijay',
     'Ravi', 'Mukesh', 'Amit', 'Rahul', 'Santosh', 'Naresh', 'Arjun', 'Babu',
@@ -55,7 +136,7 @@ def generate_bihar_farmer_name():
     'Shyam','Subhash','Trilok','Tulsidas','Vaibhav','Vishal','Gautam','Ranjan','Mahendra','Shambhu'
 ]
 
-    last_names = [
+LAST_NAMES = [
     'Sahu', 'Tiwari', 'Prasad', 'Jaiswal', 'Kumar', 'Singh', 'Yadav',
     'Mishra', 'Pandey', 'Verma', 'Gupta', 'Maurya', 'Patel', 'Dubey',
     'Chaudhary', 'Das', 'Mandal', 'Nath', 'Rai', 'Shah', 'Sinha', 'Thakur',
@@ -68,8 +149,15 @@ def generate_bihar_farmer_name():
     'Pillai', 'Purohit', 'Rathore', 'Rawat', 'Sarkar', 'Seth', 'Shukla',
     'Siddiqui', 'Soni','Saini','Bhardwaj','Rana','Malik','Tyagi','Goswami',
     'Narang','Katiyar','Chauhan','Chawla'
-    ]
-    return f"{random.choice(first_names)} {random.choice(last_names)}"
+]
+
+# The raw tables repeat a few surnames; the unique sampler works on distinct names
+UNIQUE_FIRST_NAMES = list(dict.fromkeys(FIRST_NAMES))
+UNIQUE_LAST_NAMES = list(dict.fromkeys(LAST_NAMES))
+
+def generate_bihar_farmer_name():
+    """Generate a realistic Bihar farmer name."""
+    return f"{random.choice(FIRST_NAMES)} {random.choice(LAST_NAMES)}"
 
 # def generate_indian_business_names(count=10):
 #     """Generate multiple Indian business names."""
@@ -79,242 +167,722 @@ def generate_bihar_farmer_names(count=10):
     """Generate multiple Bihar farmer names."""
     return [generate_bihar_farmer_name() for _ in range(count)]
 
+def unique_farmer_name(index):
+    """Return the farmer name at position `index` of the deterministic name sequence.
+
+    The first len(first) * len(last) indices are the plain "First Last"
+    combinations. Each following block of that size repeats them with a
+    father's name ("First Last S/O Father"), and once every father's name is
+    used a block number is appended, so every index maps to a distinct name.
+    """
+    first_count = len(UNIQUE_FIRST_NAMES)
+    combinations = first_count * len(UNIQUE_LAST_NAMES)
+    block, position = divmod(index, combinations)
+    first, last = divmod(position, len(UNIQUE_LAST_NAMES))
+    name = f"{UNIQUE_FIRST_NAMES[first]} {UNIQUE_LAST_NAMES[last]}"
+    if block == 0:
+        return name
+
+    round_number, father = divmod(block - 1, first_count)
+    name = f"{name} S/O {UNIQUE_FIRST_NAMES[father]}"
+    if round_number:
+        name = f"{name} ({round_number + 1})"
+    return name
+
+def sample_unique_farmer_names(count):
+    """Return `count` distinct farmer names in random order, in O(count) time.
+
+    Indices into the name sequence of `unique_farmer_name` are sampled
+    without replacement one block of combinations at a time, so there is no
+    retry loop and the run always ends, however many names are needed.
+    """
+    combinations = len(UNIQUE_FIRST_NAMES) * len(UNIQUE_LAST_NAMES)
+    names = []
+    block_start = 0
+    while len(names) < count:
+        take = min(combinations, count - len(names))
+        names.extend(unique_farmer_name(block_start + i) for i in random.sample(range(combinations), take))
+        block_start += combinations
+    return names
+
 def generate_party_dataset(total_amount, party_limit):
-    """Generate a dictionary of parties with balanced distribution of the total amount."""
+    """Generate a dictionary of parties with balanced distribution of the total amount.
+
+    Amounts are given in rupees; the returned balances are int paise.
+    """
     try:
+        total_amount = to_paise(total_amount)
+        party_limit = to_paise(party_limit)
         if total_amount <= 0 or party_limit <= 0:
             raise ValueError("Total amount and party limit must be positive")
             
         if party_limit > total_amount:
             raise ValueError("Party limit cannot be greater than total amount")
             
-        num_parties = int((total_amount + party_limit - 1) // party_limit)# Round up division
+        num_parties = (total_amount + party_limit - 1) // party_limit # Round up division
         
-        # Generate party names with realistic Indian business names
-        used_names = set()
+        # Generate unique, realistic farmer names for the parties
+        party_names = sample_unique_farmer_names(num_parties)
         party_data = {}
 
-        for i in range(num_parties):
-            # Generate unique business name
-            while True:
-                party_name = generate_bihar_farmer_name()
-                if party_name not in used_names:
-                    used_names.add(party_name)
-                    break
-            
-            
+        for i, party_name in enumerate(party_names):
             # For the last party, adjust the balance to match total_amount exactly
             if i == num_parties - 1:
                 remaining = total_amount - (party_limit * (num_parties - 1))
-                party_data[party_name] = float(remaining)
+                party_data[party_name] = remaining
             else:
-                party_data[party_name] = float(party_limit)
+                party_data[party_name] = party_limit
                 
         return party_data
     except Exception as e:
         raise Exception(f"Error generating party dataset: {str(e)}")
 
 def format_rate(value):
-    """Format rate to always show two decimal places."""
-    return f"{float(value):.2f}"
+    """Format a rate (paise) or margin (basis points) to always show two decimal places."""
+    return format_hundredths(value)
 
+@functools.lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
 def normalize_party_name(name):
-    """Normalize the UNR- prefix in party names with robust handling of variations and ensure name is uppercase."""
+    """Normalize the UNR- prefix in party names with robust handling of variations and ensure name is uppercase.
+
+    The longest spelling in UNR_PREFIX_VARIATIONS that starts the name
+    (ignoring case) is replaced by "UNR-". Results are memoized, since the
+    same ledgers are normalized run after run.
+    """
     try:
         name = str(name).strip()
-        standard_prefix = "UNR-"
-        
-        # List of possible prefix variations (case-insensitive)
-        prefix_variations = [
-            "UNR-", "UNR - ", "UNR ", "UNREGISTERED-", "UNREGISTERED - ",
-            "UNREGISTERED", "UNR_", "UNR_ ", "UNR.", "UNR. ", "U.N.R-",
-            "U.N.R", "U.N.R ", "U N R-", "U N R", "U N R "
-        ]
-        
-        # Convert to uppercase for comparison
-        name_upper = name.upper()
-        
-        # Remove any existing variations of the prefix
-        for prefix in prefix_variations:
-            if name_upper.startswith(prefix):
-                # Get the name part after the prefix
-                name = name[len(prefix):].strip()
-                break
-        
+        match = UNR_PREFIX.match(name.upper())
+        if match:
+            # Get the name part after the prefix
+            name = name[match.end():].strip()
+
         # Convert the name part to uppercase and add the standardized prefix
-        return standard_prefix + name.upper()
+        return STANDARD_PREFIX + name.upper()
     except Exception as e:
         print(f"Error normalizing party name '{name}': {str(e)}", file=sys.stderr)
         return name
 
-class InvoiceGenerator:
-    def __init__(self, start_date, end_date, start_invoice_number, min_rate, max_rate, min_margin, max_margin, invoice_type):
+def normalize_party_names(names):
+    """`normalize_party_name` for a pandas Series of names.
+
+    The stripped names are joined into one newline-separated text, so the
+    uppercasing and the prefix match (UNR_PREFIX_LINES) each run once in C
+    over the whole column rather than once per name.
+    """
+    import pandas as pd
+
+    text = "\n".join([str(name).strip() for name in names]).upper()
+    if text.count("\n") != len(names) - 1:
+        # A name with a line break of its own would shift the split below
+        return names.map(normalize_party_name)
+    lines = UNR_PREFIX_LINES.sub("", text).split("\n")
+    return pd.Series([STANDARD_PREFIX + line for line in lines], index=names.index, dtype=object)
+
+def read_party_text(path, use_mmap=False):
+    """Whole party file as text with universal newlines, decoded straight from a memory map if asked."""
+    with open(path, 'rb') as f:
+        if use_mmap and os.fstat(f.fileno()).st_size:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                text = str(memoryview(mapped), 'utf-8')
+        else:
+            text = f.read().decode('utf-8')
+    return text.replace('\r\n', '\n').replace('\r', '\n')
+
+def load_party_file(path, use_mmap=False, bulk_lines=BULK_PARTY_LINES):
+    """Load a `name,balance` party file as {normalized party name: balance in paise}.
+
+    The balance is whatever follows the last comma, so names may themselves
+    contain commas. Lines without a comma are ignored, and unparseable or
+    non-positive balances are skipped with a warning. Parties that
+    normalize to the same name have their balances summed (in order of
+    first appearance) instead of the later line overwriting the earlier one.
+    Files of `bulk_lines` lines or more are parsed column-wise (see
+    `bulk_party_balances`); both ways give the same result.
+    """
+    lines = read_party_text(path, use_mmap).split('\n')
+    line_numbers = [number for number, line in enumerate(lines, 1) if ',' in line]
+    if not line_numbers:
+        return {}
+    lines = [lines[number - 1].strip() for number in line_numbers]
+    parts = [line.rpartition(',') for line in lines]
+    names = [part[0].strip() for part in parts]
+    raw_balances = [part[2].strip() for part in parts]
+
+    bulk = len(lines) >= bulk_lines
+    balances = bulk_party_balances(raw_balances) if bulk else [party_balance(raw) for raw in raw_balances]
+    for i, balance in enumerate(balances):
+        if balance is None:
+            print(f"Warning: Skipping invalid line {line_numbers[i]}: {lines[i]}", file=sys.stderr)
+    for i, balance in enumerate(balances):
+        if balance is not None and balance <= 0:
+            print(f"Warning: Skipping line {line_numbers[i]}, balance must be positive: {lines[i]}", file=sys.stderr)
+    keep = [i for i, balance in enumerate(balances) if balance is not None and balance > 0]
+
+    # Normalize the names, then sum balances per normalized name
+    names = [names[i] for i in keep]
+    if bulk:
+        import pandas as pd
+        names = normalize_party_names(pd.Series(names, dtype=object)).tolist()
+    else:
+        names = [normalize_party_name(name) for name in names]
+    party_data = {}
+    for name, i in zip(names, keep):
+        party_data[name] = party_data.get(name, 0) + balances[i]
+    return party_data
+
+def party_balance(raw):
+    """Balance text as int paise, or None if it is not a number."""
+    try:
+        return to_paise(raw)
+    except ValueError:
+        return None
+
+def bulk_party_balances(raw_balances):
+    """`party_balance` for a whole column of balance texts at once.
+
+    Every balance is parsed as a float in one pass; values that are not
+    numbers, are too large for exact float paise or sit on a half-paisa tie
+    are redone exactly with to_paise.
+    """
+    import numpy as np
+    import pandas as pd
+
+    values = pd.to_numeric(pd.Series(raw_balances, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+    exact = np.abs(values) < MAX_FLOAT_RUPEES
+    balances, tie = round_half_up_array(np.where(exact, values, 0), 2)
+    exact &= ~tie
+    balances = balances.tolist()
+    for i in np.flatnonzero(~exact).tolist():
+        balances[i] = party_balance(raw_balances[i])
+    return balances
+
+class DateSlotAllocator:
+    """Weighted invoice dates handed out in chronological order.
+
+    Each day is stored once with its remaining slot count, and a cursor skips
+    exhausted days, so taking the next date is O(1) amortized instead of
+    rescanning a list with one entry per slot.
+    """
+
+    def __init__(self):
+        self.dates = []
+        self.counts = []
+        self.cursor = 0
+
+    def add_day(self, date, weight):
+        """Append a day with `weight` slots; days must be added in ascending order."""
+        if weight > 0:
+            self.dates.append(date)
+            self.counts.append(weight)
+
+    def take(self):
+        """Return the earliest date with a free slot, or None when all slots are used."""
+        while self.cursor < len(self.dates):
+            if self.counts[self.cursor] > 0:
+                self.counts[self.cursor] -= 1
+                return self.dates[self.cursor]
+            self.cursor += 1
+        return None
+
+    def remaining(self):
+        """Number of slots not yet handed out."""
+        return sum(self.counts[self.cursor:])
+
+    def remaining_days(self):
+        """(date, free slots) for each day that still has free slots, in order."""
+        return [(date, count) for date, count in zip(self.dates[self.cursor:], self.counts[self.cursor:]) if count > 0]
+
+class InvoicePricer:
+    """Prices invoices (rate, margin, quantity, value) within the configured limits.
+
+    Holds no dates or invoice numbers, so parallel shards can price
+    invoices independently and leave numbering to `InvoiceGenerator`.
+    """
+
+    def __init__(self, min_rate, max_rate, min_margin, max_margin, invoice_type):
+        self.min_rate = float(min_rate)
+        self.max_rate = float(max_rate)
+        
+        if self.min_rate > self.max_rate:
+            raise ValueError("Minimum rate must be less than maximum rate")
+            
+        self.min_margin = float(min_margin)
+        self.max_margin = float(max_margin)
+        
+        if self.min_margin > self.max_margin:
+            raise ValueError("Minimum margin must be less than maximum margin")          
+        self.invoice_type = invoice_type  # Store invoice type (purchase or sales)
+
+        # Invoice value limits, in paise
+        self.min_invoice = to_paise(15000) if invoice_type == "sales" else to_paise(20000) # Minimum invoice value
+        self.max_invoice = to_paise(48000) # Maximum invoice value
+        self.numpy_rng = None
+        self.retries = 0  # Invoices that needed the rate retry branch
+        self.fallbacks = 0  # Batch rows re-priced by the scalar path
+
+    def _uniform(self, low, high, u):
+        """Same value as random.uniform(low, high) for the underlying draw `u` in [0, 1)."""
+        low = float(low)
+        return low + (float(high) - low) * u
+
+    def _price_invoice(self, remaining_balance, draw=None):
+        """Price one invoice (rate, margin, quantity, value) against `remaining_balance`.
+
+        All amounts are int paise, rates are paise per kg and the margin is in
+        basis points. `draw(name)` supplies the uniform [0, 1) numbers for the
+        "rate", "margin", "retry_rate" and "quantity" draws. By default they
+        come from the module RNG in that call order, exactly like random.uniform.
+        """
+        if draw is None:
+            draw = lambda name: random.random()
+
+        # Generate purchase rate
+        rate = round_half_up(self._uniform(self.min_rate, self.max_rate, draw("rate")), 2)
+
+        # Generate margin and calculate sale rate
+        margin_percentage = round_half_up(self._uniform(self.min_margin, self.max_margin, draw("margin")), 2)
+        sale_rate = div_half_up(rate * (10000 + margin_percentage), 10000)
+
+        # Use appropriate rate based on invoice type
+        calculation_rate = sale_rate if self.invoice_type == 'sales' else rate
+
+        # Calculate min and max quantities using the appropriate rate
+        min_quantity = div_half_up(self.min_invoice, calculation_rate)
+        max_quantity = div_half_up(min(self.max_invoice, remaining_balance), calculation_rate)
+
+        if min_quantity > max_quantity:
+            # Recalculate rate and quantities if constraints cannot be met
+            self.retries += 1
+            rate = round_half_up(self._uniform(self.min_rate, self.max_rate, draw("retry_rate")), 2)
+            sale_rate = div_half_up(rate * (10000 + margin_percentage), 10000)
+            calculation_rate = sale_rate if self.invoice_type == 'sales' else rate
+            min_quantity = div_half_up(self.min_invoice, calculation_rate)
+            max_quantity = div_half_up(min(self.max_invoice, remaining_balance), calculation_rate)
+
+        # Generate random quantity
+        quantity = round_half_up(self._uniform(min_quantity, max_quantity, draw("quantity")), 0)
+
+        # Calculate invoice value using the appropriate rate, in whole rupees
+        invoice_value = div_half_up(calculation_rate * quantity, 100) * 100
+
+        # Validate and adjust if needed
+        if invoice_value < self.min_invoice or invoice_value > self.max_invoice:
+            quantity = min_quantity
+            invoice_value = div_half_up(calculation_rate * quantity, 100) * 100
+
+        return {
+            "quantity": quantity,
+            "rate": rate,
+            "sale_rate": sale_rate,
+            "margin_percentage": margin_percentage,
+            "invoice_value": invoice_value,
+        }
+
+    def price_invoice_or_none(self, remaining_balance, draw=None):
+        """Scalar pricing that, like `generate_invoice`, returns None instead of raising."""
+        try:
+            if remaining_balance < self.min_invoice:
+                return None
+            return self._price_invoice(remaining_balance, draw)
+        except Exception as e:
+            print(f"Error generating invoice: {str(e)}", file=sys.stderr)
+            return None
+
+    def _numpy_rng(self):
+        """NumPy generator for batch draws, seeded from the module RNG so runs stay reproducible."""
+        if self.numpy_rng is None:
+            import numpy as np
+            self.numpy_rng = np.random.default_rng(random.getrandbits(64))
+        return self.numpy_rng
+
+    def price_invoices(self, balances):
+        """Price one invoice per entry of `balances` in a single vectorized pass.
+
+        Applies the same rules as `_price_invoice` on int64 paise arrays:
+        rates and margins rounded half-up to 0.01, quantities and invoice
+        values to whole units, and the min/max invoice limits. Rows that need
+        the rate retry, or whose float draws sit too close to a rounding tie
+        to decide exactly, are re-priced by `_price_invoice` from the same
+        draws. Returns a list of priced invoices, with None where
+        `generate_invoice` would return None.
+        """
+        import numpy as np
+
+        n = len(balances)
+        if n == 0:
+            return []
+
+        rng = self._numpy_rng()
+        draws = {name: rng.random(n) for name in ("rate", "margin", "retry_rate", "quantity")}
+
+        balance_paise = np.array(balances, dtype=np.int64)
+        min_invoice = self.min_invoice
+        max_invoice = self.max_invoice
+
+        rate_paise, rate_tie = round_half_up_array(
+            self._uniform(self.min_rate, self.max_rate, draws["rate"]), 2
+        )
+        margin_basis_points, margin_tie = round_half_up_array(
+            self._uniform(self.min_margin, self.max_margin, draws["margin"]), 2
+        )
+        sale_rate_paise = div_half_up_array(rate_paise * (10000 + margin_basis_points), 10000)
+        calculation_rate = sale_rate_paise if self.invoice_type == 'sales' else rate_paise
+
+        bad_rate = calculation_rate <= 0
+        calculation_rate = np.where(bad_rate, 1, calculation_rate)
+        min_quantity = div_half_up_array(np.full(n, min_invoice, dtype=np.int64), calculation_rate)
+        max_quantity = div_half_up_array(np.minimum(max_invoice, balance_paise), calculation_rate)
+        needs_retry = min_quantity > max_quantity
+
+        quantity, quantity_tie = round_half_up_array(
+            min_quantity + (max_quantity - min_quantity) * draws["quantity"], 0
+        )
+        invoice_value = div_half_up_array(calculation_rate * quantity, 100) * 100
+
+        out_of_range = (invoice_value < min_invoice) | (invoice_value > max_invoice)
+        quantity = np.where(out_of_range, min_quantity, quantity)
+        invoice_value = np.where(
+            out_of_range, div_half_up_array(calculation_rate * min_quantity, 100) * 100, invoice_value
+        )
+
+        skipped = balance_paise < min_invoice
+        fallback = needs_retry | bad_rate | rate_tie | margin_tie | quantity_tie
+
+        # Plain Python lists are much faster to walk row by row than NumPy scalars
+        skipped = skipped.tolist()
+        fallback = fallback.tolist()
+        columns = zip(
+            quantity.tolist(), rate_paise.tolist(), sale_rate_paise.tolist(),
+            margin_basis_points.tolist(), invoice_value.tolist()
+        )
+
+        results = []
+        for i, (row_quantity, row_rate, row_sale_rate, row_margin, row_value) in enumerate(columns):
+            if skipped[i]:
+                results.append(None)
+            elif fallback[i]:
+                self.fallbacks += 1
+                results.append(self.price_invoice_or_none(balances[i], lambda name: float(draws[name][i])))
+            else:
+                results.append({
+                    "quantity": row_quantity,
+                    "rate": row_rate,
+                    "sale_rate": row_sale_rate,
+                    "margin_percentage": row_margin,
+                    "invoice_value": row_value,
+                })
+        return results
+
+class InvoiceGenerator(InvoicePricer):
+    def __init__(self, start_date, end_date, start_invoice_number, min_rate, max_rate, min_margin, max_margin, invoice_type, resume_state=None):
         try:
             self.start_date = datetime.strptime(start_date, '%Y-%m-%d')
             self.end_date = datetime.strptime(end_date, '%Y-%m-%d')
             
             if self.start_date > self.end_date:
                 raise ValueError("Start date must be before end date")
-                
-            self.min_rate = Decimal(str(min_rate))
-            self.max_rate = Decimal(str(max_rate))
-            
-            if self.min_rate > self.max_rate:
-                raise ValueError("Minimum rate must be less than maximum rate")
-                
-            self.min_margin = Decimal(str(min_margin))
-            self.max_margin = Decimal(str(max_margin))
-            
-            if self.min_margin > self.max_margin:
-                raise ValueError("Minimum margin must be less than maximum margin")          
-            self.invoice_type = invoice_type  # Store invoice type (purchase or sales)
-    
-            self.min_invoice = Decimal("15000") if invoice_type == "sales" else Decimal("20000") # Minimum invoice value
-            self.max_invoice = Decimal("48000") # Maximum invoice value
+
+            super().__init__(min_rate, max_rate, min_margin, max_margin, invoice_type)
             self.global_invoice_counter = int(start_invoice_number)
             self.last_invoice_date = self.start_date
             
-             # Initialize date ranges with weighted distribution
-            self.available_dates = []
-            current_date = self.start_date
-            while current_date <= self.end_date:
-                # Higher weights for mid-month dates, lower for month start/end
-                day_of_month = current_date.day
-                if 5 <= day_of_month <= 25:
-                    weight = random.randint(2, 5)  # More invoices in mid-month
-                else:
-                    weight = random.randint(1, 3)  # Fewer invoices at month edges
-                    
-                self.available_dates.extend([current_date] * weight)
-                current_date += timedelta(days=1)
-            
-             # Sort dates to maintain chronological order
-            self.available_dates.sort()
+            # Initialize date ranges with weighted distribution
+            self.date_slots = DateSlotAllocator()
+            first_new_date = self.start_date
+            if resume_state is not None:
+                first_new_date = self.restore(resume_state)
+            self.add_days(first_new_date, self.end_date)
             
         except ValueError as e:
             raise ValueError(f"Invalid input parameters: {str(e)}")
         except Exception as e:
             raise Exception(f"Error initializing InvoiceGenerator: {str(e)}")
 
+    def add_days(self, first_date, last_date):
+        """Add weighted date slots for each day from `first_date` to `last_date`."""
+        current_date = first_date
+        while current_date <= last_date:
+            # Higher weights for mid-month dates, lower for month start/end
+            day_of_month = current_date.day
+            if 5 <= day_of_month <= 25:
+                weight = random.randint(2, 5)  # More invoices in mid-month
+            else:
+                weight = random.randint(1, 3)  # Fewer invoices at month edges
+
+            self.date_slots.add_day(current_date, weight)
+            current_date += timedelta(days=1)
+
+    def restore(self, state):
+        """Continue the series saved in `state` (see `generator_state`).
+
+        The invoice counter and last invoice date carry over, as do free
+        slots of days on or after `start_date`. Returns the first day that
+        still needs slots: the day after the saved period, or `start_date`
+        when that is later.
+        """
+        if state["invoice_type"] != self.invoice_type:
+            raise ValueError(f"State file is for {state['invoice_type']} invoices, not {self.invoice_type}")
+
+        self.global_invoice_counter = int(state["next_invoice_number"])
+        self.last_invoice_date = datetime.strptime(state["last_invoice_date"], '%Y-%m-%d')
+        for day, count in state["date_slots"]:
+            day = datetime.strptime(day, '%Y-%m-%d')
+            if day >= self.start_date:
+                self.date_slots.add_day(day, int(count))
+
+        saved_end = datetime.strptime(state["end_date"], '%Y-%m-%d')
+        first_new_date = max(self.start_date, saved_end + timedelta(days=1))
+        # Carried slots past this run's end date stay for the next one
+        self.end_date = max(self.end_date, saved_end)
+        return first_new_date
+
     def get_next_date(self):
         """Get the next available date, ensuring chronological order."""
-        if not self.available_dates:
-            return self.last_invoice_date
-        
-        # Find all dates that are after the last invoice date
-        valid_dates = [d for d in self.available_dates if d >= self.last_invoice_date]
-        
-        if not valid_dates:
+        next_date = self.date_slots.take()
+        if next_date is None:
             return self.last_invoice_date
-            
-        # Pick the earliest available date from valid dates
-        next_date = valid_dates[0]
-        self.available_dates.remove(next_date)
+
         self.last_invoice_date = next_date
-        
         return next_date
 
+    def stamp_invoice(self, invoice, next_date, remaining_balance):
+        """Add the date, the next invoice number and the balance left to a priced invoice."""
+        # Generate invoice number based on type
+        if self.invoice_type == 'sales':
+            invoice_no = f"A{self.global_invoice_counter:06d}"
+        else:
+            invoice_month = next_date.strftime("%b").upper()
+            invoice_no = f"{invoice_month}-{self.global_invoice_counter:03d}"
+        
+        self.global_invoice_counter += 1
+
+        invoice["invoice_no"] = invoice_no
+        invoice["date"] = next_date
+        invoice["remaining_balance"] = remaining_balance - invoice["invoice_value"]
+        return invoice
+
     def generate_invoice(self, remaining_balance):
         try:
             if remaining_balance < self.min_invoice:
                 return None
 
             next_date = self.get_next_date()
+            invoice = self._price_invoice(remaining_balance)
+            return self.stamp_invoice(invoice, next_date, remaining_balance)
+        except Exception as e:
+            print(f"Error generating invoice: {str(e)}", file=sys.stderr)
+            return None
 
-            # Generate purchase rate
-            rate = Decimal(
-                str(random.uniform(float(self.min_rate), float(self.max_rate)))
-            ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
+def generator_state(generator, balances):
+    """JSON-ready snapshot of a finished run, for continuing the series with `--resume`.
 
-            # Generate margin and calculate sale rate
-            margin_percentage = Decimal(
-                str(random.uniform(float(self.min_margin), float(self.max_margin)))
-            ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-            
-            sale_rate = (rate * (1 + margin_percentage / 100)).quantize(
-                Decimal("0.01"), rounding=ROUND_HALF_UP
-            )
+    Holds the next invoice number, the last invoice date, the free date
+    slots, every party's balance left over (in paise, from `balances`) and
+    the state of the `random` module, so the next run draws exactly the
+    numbers this one would have drawn next.
+    """
+    version, internal, gauss = random.getstate()
+    return {
+        "version": STATE_VERSION,
+        "invoice_type": generator.invoice_type,
+        "next_invoice_number": generator.global_invoice_counter,
+        "last_invoice_date": generator.last_invoice_date.strftime('%Y-%m-%d'),
+        "end_date": generator.end_date.strftime('%Y-%m-%d'),
+        "date_slots": [[day.strftime('%Y-%m-%d'), count] for day, count in generator.date_slots.remaining_days()],
+        "balances": {name: int(balance) for name, balance in balances.items() if balance > 0},
+        "random_state": [version, list(internal), gauss],
+    }
 
-            # Use appropriate rate based on invoice type
-            calculation_rate = sale_rate if self.invoice_type == 'sales' else rate
+def save_state(path, state):
+    """Write a `generator_state` snapshot to `path`, replacing it only once fully written."""
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w') as f:
+        json.dump(state, f)
+    os.replace(temp_path, path)
 
-            # Calculate min and max quantities using the appropriate rate
-            min_quantity = (self.min_invoice / calculation_rate).quantize(Decimal("1."), rounding=ROUND_HALF_UP)
-            max_quantity = (min(self.max_invoice, remaining_balance) / calculation_rate).quantize(
-                Decimal("1."), rounding=ROUND_HALF_UP
-            )
-
-            if min_quantity > max_quantity:
-                # Recalculate rate and quantities if constraints cannot be met
-                rate = Decimal(
-                    str(random.uniform(float(self.min_rate), float(self.max_rate)))
-                ).quantize(Decimal("0.01"), rounding=ROUND_HALF_UP)
-                sale_rate = (rate * (1 + margin_percentage / 100)).quantize(
-                    Decimal("0.01"), rounding=ROUND_HALF_UP
-                )
-                calculation_rate = sale_rate if self.invoice_type == 'sales' else rate
-                min_quantity = (self.min_invoice / calculation_rate).quantize(Decimal("1."), rounding=ROUND_HALF_UP)
-                max_quantity = (min(self.max_invoice, remaining_balance) / calculation_rate).quantize(
-                    Decimal("1."), rounding=ROUND_HALF_UP
-                )
-
-            # Generate random quantity
-            quantity = Decimal(
-                str(random.uniform(float(min_quantity), float(max_quantity)))
-            ).quantize(Decimal("1."), rounding=ROUND_HALF_UP)
-
-            # Calculate invoice value using the appropriate rate
-            invoice_value = (calculation_rate * quantity).quantize(
-                Decimal("100."), rounding=ROUND_HALF_UP
-            )
-
-            # Validate and adjust if needed
-            if invoice_value < self.min_invoice or invoice_value > self.max_invoice:
-                quantity = (self.min_invoice / calculation_rate).quantize(Decimal("1."), rounding=ROUND_HALF_UP)
-                invoice_value = (calculation_rate * quantity).quantize(
-                    Decimal("100."), rounding=ROUND_HALF_UP
-                )
-
-            # Generate invoice number based on type
-            if self.invoice_type == 'sales':
-                invoice_no = f"A{self.global_invoice_counter:06d}"
-            else:
-                invoice_month = next_date.strftime("%b").upper()
-                invoice_no = f"{invoice_month}-{self.global_invoice_counter:03d}"
-            
-            self.global_invoice_counter += 1
-
-            return {
-                "invoice_no": invoice_no,
-                "quantity": quantity,
-                "rate": rate,
-                "sale_rate": sale_rate,
-                "margin_percentage": margin_percentage,
-                "invoice_value": invoice_value,
-                "date": next_date,
-                "remaining_balance": remaining_balance - invoice_value,
+def load_state(path):
+    """Read a `save_state` file and restore the `random` module state it holds."""
+    try:
+        with open(path, 'r') as f:
+            state = json.load(f)
+    except (OSError, ValueError) as e:
+        raise ValueError(f"Cannot read state file {path}: {str(e)}")
+    if state.get("version") != STATE_VERSION:
+        raise ValueError(f"Unsupported state file version in {path}: {state.get('version')}")
+
+    version, internal, gauss = state["random_state"]
+    random.setstate((version, tuple(internal), gauss))
+    return state
+
+def carry_balances(balances, party_data, normalized=False):
+    """Balances left in a state file plus this run's `party_data`, by normalized party name.
+
+    Carried parties keep their order and come first; a party in both gets
+    the sum.
+    """
+    merged = {name: int(balance) for name, balance in balances.items()}
+    for party_name, balance in party_data.items():
+        name = party_name if normalized or party_name == "CASH" else normalize_party_name(party_name)
+        merged[name] = merged.get(name, 0) + int(balance)
+    return merged
+
+def invoice_row(invoice, party_name, product_name, invoice_type, typed=False):
+    """Format a generated invoice as an output row.
+
+    With `typed`, the date stays a date and money, rates and margins stay
+    integer hundredths, for the Parquet/Arrow writer.
+    """
+    if typed:
+        date, money, hundredths = invoice["date"].date(), int, int
+    else:
+        date, money, hundredths = invoice["date"].strftime("%d-%m-%Y"), paise_to_rupees, format_rate
+
+    if invoice_type == 'sales':
+        return {
+            "Invoice Date": date,
+            "Invoice No": invoice["invoice_no"],
+            "Party Name": party_name,
+            "Product": product_name,
+            "Quantity (kg)": int(invoice["quantity"]),
+            "Sale Rate (Rs./kg)": hundredths(invoice["sale_rate"]),
+            "Invoice Value (Rs.)": money(invoice["invoice_value"]),
+            "Flag": "S"
+        }
+    return {
+        "Invoice Date": date,
+        "Invoice No": invoice["invoice_no"],
+        "Party Name": party_name,
+        "Product": product_name,
+        "Quantity (kg)": int(invoice["quantity"]),
+        "Pur. Rate (Rs./kg)": hundredths(invoice["rate"]),
+        "Invoice Value (Rs.)": money(invoice["invoice_value"]),
+        "Sale Rate (Rs./kg)": hundredths(invoice["sale_rate"]),
+        "Margin (%)": hundredths(invoice["margin_percentage"]),
+        "Balance Remaining (Rs.)": money(invoice["remaining_balance"]),
+    }
+
+def csv_row(row):
+    """The CSV form of a typed `invoice_row`, identical to `invoice_row(..., typed=False)`."""
+    formatted = dict(row)
+    formatted["Invoice Date"] = row["Invoice Date"].strftime("%d-%m-%Y")
+    for column in HUNDREDTHS_COLUMNS.intersection(row):
+        formatted[column] = paise_to_rupees(row[column]) if column in MONEY_COLUMNS else format_rate(row[column])
+    return formatted
+
+class InvoiceRollups:
+    """Per-party and per-month totals kept while invoices are written, for `--rollups`.
+
+    `tap` passes typed rows through unchanged and adds each one to the
+    totals, so the summary costs no second pass over the output. `record`
+    reconciles the totals against the balances the run started and ended with.
+    """
+
+    def __init__(self, invoice_type):
+        self.invoice_type = invoice_type
+        # Party name / (year, month) -> [invoices, quantity (kg), value (paise)]
+        self.parties = {}
+        self.months = {}
+
+    def tap(self, rows):
+        parties, months = self.parties, self.months
+        for row in rows:
+            quantity, value = row["Quantity (kg)"], row["Invoice Value (Rs.)"]
+            day = row["Invoice Date"]
+            for totals, key in ((parties, row["Party Name"]), (months, (day.year, day.month))):
+                entry = totals.get(key)
+                if entry is None:
+                    entry = totals[key] = [0, 0, 0]
+                entry[0] += 1
+                entry[1] += quantity
+                entry[2] += value
+            yield row
+
+    def record(self, opening, closing):
+        """JSON-ready rollups; `opening` and `closing` map party names to balances in paise.
+
+        A party is reconciled when its opening balance equals its invoiced
+        value plus its closing balance.
+        """
+        parties = []
+        mismatched = []
+        for name in sorted(set(opening) | set(self.parties)):
+            invoices, quantity, value = self.parties.get(name, (0, 0, 0))
+            entry = {
+                "party": name,
+                "invoices": invoices,
+                "quantity_kg": quantity,
+                "value": paise_to_rupees(value),
+                "opening_balance": paise_to_rupees(opening.get(name, 0)),
+                "closing_balance": paise_to_rupees(closing.get(name, 0)),
             }
-        except Exception as e:
-            print(f"Error generating invoice: {str(e)}", file=sys.stderr)
-            return None
+            parties.append(entry)
+            if opening.get(name, 0) != value + closing.get(name, 0):
+                mismatched.append(entry)
 
-def generate_all_invoices(party_data, start_date, end_date, start_invoice_number, product_name, min_rate, max_rate, min_margin, max_margin, invoice_type):
+        value = sum(entry[2] for entry in self.parties.values())
+        return {
+            "script": "generate_invoices",
+            "invoice_type": self.invoice_type,
+            "totals": {
+                "invoices": sum(entry[0] for entry in self.parties.values()),
+                "quantity_kg": sum(entry[1] for entry in self.parties.values()),
+                "value": paise_to_rupees(value),
+                "opening_balance": paise_to_rupees(sum(opening.values())),
+                "closing_balance": paise_to_rupees(sum(closing.values())),
+            },
+            "months": [
+                {"month": f"{year}-{month:02d}", "invoices": invoices, "quantity_kg": quantity, "value": paise_to_rupees(value)}
+                for (year, month), (invoices, quantity, value) in sorted(self.months.items())
+            ],
+            "parties": parties,
+            "reconciliation": {"balanced": not mismatched, "mismatched_parties": mismatched},
+        }
+
+def opening_balances(party_data, invoice_type, normalized=False):
+    """The balances a run starts from, by output party name (in paise), for `InvoiceRollups.record`."""
+    if invoice_type == 'sales':
+        return {"CASH": sum(int(balance) for balance in party_data.values())}
+    opening = {}
+    for party_name, balance in party_data.items():
+        name = party_name if normalized else normalize_party_name(party_name)
+        opening[name] = opening.get(name, 0) + int(balance)
+    return opening
+
+def iter_invoice_rows(party_data, start_date, end_date, start_invoice_number, product_name, min_rate, max_rate, min_margin, max_margin, invoice_type, vectorized=False, workers=1, typed=False, normalized=False, generator=None, balances=None):
+    """Yield invoice rows one at a time, in invoice number (and therefore date) order.
+
+    `party_data` maps party names to balances in paise. With `vectorized`,
+    invoices are priced in NumPy batches (see `iter_batched_invoices`)
+    instead of one `generate_invoice` call each. With `workers` > 1,
+    purchase parties are priced in parallel shards (see
+    `iter_sharded_invoices`). `typed` rows are for the Parquet/Arrow writer
+    (see `invoice_row`). Pass `normalized` when the party names already went
+    through `normalize_party_name` (see `load_party_file`).
+
+    A prepared `generator` (e.g. one resumed from a state file) replaces
+    the one built from the dates and limits. A `balances` dict is filled
+    with each party's balance as invoices are made, for `generator_state`.
+    """
     try:
-        generator = InvoiceGenerator(start_date, end_date, start_invoice_number, min_rate, max_rate, min_margin, max_margin, invoice_type)
-        all_results = []
+        if generator is None:
+            generator = InvoiceGenerator(start_date, end_date, start_invoice_number, min_rate, max_rate, min_margin, max_margin, invoice_type)
+        if balances is None:
+            balances = {}
 
         # For sales invoices, use single CASH party
         if invoice_type == 'sales':
-            remaining = sum(Decimal(str(balance)) for balance in party_data.values())
+            remaining = sum(int(balance) for balance in party_data.values())
             active_parties = [{"name": "CASH", "remaining": remaining}]
+            balances["CASH"] = remaining
         else:
             # For purchase invoices, use the existing party data logic
             active_parties = []
             for party_name, balance in party_data.items():
                 try:
-                    remaining = Decimal(str(balance))
+                    remaining = int(balance)
+                    normalized_name = party_name if normalized else normalize_party_name(party_name)
+                    balances[normalized_name] = remaining
                     if remaining >= generator.min_invoice:
-                        normalized_name = normalize_party_name(party_name)
                         active_parties.append({"name": normalized_name, "remaining": remaining})
                 except Exception as e:
                     print(f"Error processing party {party_name}: {str(e)}", file=sys.stderr)
@@ -323,6 +891,21 @@ def generate_all_invoices(party_data, start_date, end_date, start_invoice_number
         if not active_parties:
             raise ValueError("No valid parties with sufficient balance found")
 
+        # A single CASH party cannot be split across shards
+        if workers > 1 and len(active_parties) > 1:
+            priced = iter_sharded_invoices(generator, active_parties, workers, vectorized)
+        elif vectorized:
+            priced = iter_batched_invoices(generator, active_parties)
+        else:
+            priced = None
+
+        if priced is not None:
+            for party_name, invoice, balance in priced:
+                invoice = generator.stamp_invoice(invoice, generator.get_next_date(), balance)
+                balances[party_name] = invoice["remaining_balance"]
+                yield invoice_row(invoice, party_name, product_name, invoice_type, typed)
+            return
+
         while active_parties:
             idx = random.randint(0, len(active_parties) - 1)
             current_party = active_parties.pop(idx)
@@ -330,143 +913,525 @@ def generate_all_invoices(party_data, start_date, end_date, start_invoice_number
             invoice = generator.generate_invoice(current_party["remaining"])
 
             if invoice is not None:
-                if invoice_type == 'sales':
-                    all_results.append({
-                        "Invoice Date": invoice["date"].strftime("%d-%m-%Y"),
-                        "Invoice No": invoice["invoice_no"],
-                        "Party Name": current_party["name"],
-                        "Product": product_name,
-                        "Quantity (kg)": int(invoice["quantity"]),
-                        "Sale Rate (Rs./kg)": format_rate(invoice["sale_rate"]),
-                        "Invoice Value (Rs.)": float(invoice["invoice_value"]),
-                        "Flag": "S"
-                    })
-                else:
-                    all_results.append({
-                        "Invoice Date": invoice["date"].strftime("%d-%m-%Y"),
-                        "Invoice No": invoice["invoice_no"],
-                        "Party Name": current_party["name"],
-                        "Product": product_name,
-                        "Quantity (kg)": int(invoice["quantity"]),
-                        "Pur. Rate (Rs./kg)": format_rate(invoice["rate"]),
-                        "Invoice Value (Rs.)": float(invoice["invoice_value"]),
-                        "Sale Rate (Rs./kg)": format_rate(invoice["sale_rate"]),
-                        "Margin (%)": format_rate(invoice["margin_percentage"]),
-                        "Balance Remaining (Rs.)": float(invoice["remaining_balance"]),
-                    })
+                yield invoice_row(invoice, current_party["name"], product_name, invoice_type, typed)
                     
                 current_party["remaining"] = invoice["remaining_balance"]
+                balances[current_party["name"]] = current_party["remaining"]
 
                 if current_party["remaining"] >= generator.min_invoice:
                     active_parties.append(current_party)
 
-        if not all_results:
-            raise ValueError("No invoices could be generated with the given parameters")
-
-        return pd.DataFrame(all_results)
     except Exception as e:
         print(f"Error in generate_all_invoices: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
         raise
 
-def main():
-    try:
-        # Check if we're using the party data file or generating new data
-        if len(sys.argv) in (12, 13) and sys.argv[4] == "--generate":
-            # Auto-generate mode
-            start_date = sys.argv[1]
-            end_date = sys.argv[2]
-            start_invoice_number = sys.argv[3]
-            total_amount = float(sys.argv[5])
-            party_limit = float(sys.argv[6])
-            product_name = sys.argv[7]
-            min_rate = float(sys.argv[8])
-            max_rate = float(sys.argv[9])
-            min_margin = float(sys.argv[10])
-            max_margin = float(sys.argv[11])
-            invoice_type = sys.argv[12] if len(sys.argv) == 13 else 'purchase'
-            
-            # Generate party data only for purchase invoices
-            if invoice_type == 'sales':
-                # For sales, use a single entry with the total amount
-                party_data = {"CASH": total_amount}
+def iter_priced_invoices(generator, active_parties):
+    """Yield (party name, priced invoice, balance before it) in generation order.
+
+    Same party selection as the scalar loop in `iter_invoice_rows`, but
+    invoices are only priced; dates and numbers are stamped by the caller.
+    """
+    while active_parties:
+        idx = random.randint(0, len(active_parties) - 1)
+        party = active_parties.pop(idx)
+
+        invoice = generator.price_invoice_or_none(party["remaining"])
+        if invoice is not None:
+            balance = party["remaining"]
+            party["remaining"] = balance - invoice["invoice_value"]
+            yield party["name"], invoice, balance
+
+            if party["remaining"] >= generator.min_invoice:
+                active_parties.append(party)
+
+def iter_batched_invoices(generator, active_parties):
+    """Yield (party name, priced invoice, balance before it), pricing each round in one NumPy batch.
+
+    While a party's balance is at least the maximum invoice value, its next
+    invoices are all capped by that maximum and do not depend on each other,
+    so a round takes as many of them as the balance is sure to cover. The
+    round is shuffled so parties interleave randomly, as in the scalar loop.
+    """
+    while active_parties:
+        order = []
+        for idx, party in enumerate(active_parties):
+            if party["remaining"] < generator.max_invoice:
+                run_length = 1
             else:
-                # For purchases, generate party data as before
-                party_data = generate_party_dataset(total_amount, party_limit)
+                run_length = (party["remaining"] - generator.max_invoice) // generator.max_invoice + 1
+            order.extend([idx] * run_length)
+        random.shuffle(order)
 
-        elif len(sys.argv) in (10, 11):
-            # Manual party data file mode
-            start_date = sys.argv[1]
-            end_date = sys.argv[2]
-            start_invoice_number = sys.argv[3]
-            party_data_file = sys.argv[4]
-            product_name = sys.argv[5]
-            min_rate = float(sys.argv[6])
-            max_rate = float(sys.argv[7])
-            min_margin = float(sys.argv[8])
-            max_margin = float(sys.argv[9])
-            invoice_type = sys.argv[10] if len(sys.argv) == 11 else 'purchase'  
-
-            # Read party data from CSV
-            party_data = {}
-            try:
-                with open(party_data_file, 'r') as f:
-                    for line_number, line in enumerate(f, 1):
-                        try:
-                            if ',' in line:
-                                name, balance = line.strip().split(',')
-                                name = name.strip()
-                                balance = float(balance.strip())
-                                if balance <= 0:
-                                    print(f"Warning: Skipping line {line_number}, balance must be positive: {line.strip()}", file=sys.stderr)
-                                    continue
-                                party_data[name] = balance
-                        except ValueError as e:
-                            print(f"Warning: Skipping invalid line {line_number}: {line.strip()}", file=sys.stderr)
-                            continue
-            except Exception as e:
-                raise Exception(f"Error reading party data file: {str(e)}")
-
-            if not party_data:
-                raise ValueError("No valid party data found in the input file")
-        else:
-            raise ValueError("Invalid number of arguments. Use either:\n" +
-                           "1. Auto-generate mode: 11 arguments (with --generate)\n" +
-                           "2. Manual file mode: 9 arguments (with party data file)")
- 
-        # Generate invoices
-        df = generate_all_invoices(
-            party_data,
-            start_date,
-            end_date,
-            start_invoice_number,
-            product_name,
-            min_rate,
-            max_rate,
-            min_margin,
-            max_margin,
-            invoice_type
-        )
+        priced = generator.price_invoices([active_parties[idx]["remaining"] for idx in order])
+        priced_caps = [min(generator.max_invoice, active_parties[idx]["remaining"]) for idx in order]
+
+        dropped = set()
+        for idx, invoice, priced_cap in zip(order, priced, priced_caps):
+            if idx in dropped:
+                continue
+            party = active_parties[idx]
+            if priced_cap != min(generator.max_invoice, party["remaining"]):
+                # An earlier invoice in the run pushed the balance under the cap
+                invoice = generator.price_invoice_or_none(party["remaining"])
+            if invoice is None:
+                # Same as the scalar loop: a party that cannot be invoiced drops out
+                dropped.add(idx)
+                continue
+
+            balance = party["remaining"]
+            party["remaining"] = balance - invoice["invoice_value"]
+            yield party["name"], invoice, balance
+
+        active_parties = [
+            party for idx, party in enumerate(active_parties)
+            if idx not in dropped and party["remaining"] >= generator.min_invoice
+        ]
+
+def _price_shard(shard):
+    """Process-pool task: price every invoice for one shard of parties with its own seed.
+
+    Returns compact tuples (party name, quantity, rate, sale rate, margin,
+    invoice value, balance before) in the shard's generation order, and the
+    shard's retry and fallback counts.
+    """
+    seed, parties, pricing, vectorized = shard
+    random.seed(seed)
+    generator = InvoicePricer(*pricing)
+    priced = iter_batched_invoices(generator, parties) if vectorized else iter_priced_invoices(generator, parties)
+    rows = [
+        (name, invoice["quantity"], invoice["rate"], invoice["sale_rate"],
+         invoice["margin_percentage"], invoice["invoice_value"], balance)
+        for name, invoice, balance in priced
+    ]
+    return rows, generator.retries, generator.fallbacks
+
+def iter_sharded_invoices(generator, active_parties, workers, vectorized=False):
+    """Price purchase invoices across a process pool and merge them into one series.
+
+    Parties are spread over `workers` shards balanced by total balance, and
+    each shard gets a seed drawn from the module RNG, so the result depends
+    only on the seed and the worker count. Shards only price invoices; the
+    merge interleaves their sequences in a seeded random order (keeping each
+    shard's own order), and the caller stamps dates and invoice numbers in
+    that single pass, which keeps numbering contiguous and chronological.
+    """
+    shards = [[] for _ in range(workers)]
+    loads = [(0, shard) for shard in range(workers)]
+    for party in sorted(active_parties, key=lambda party: -party["remaining"]):
+        load, shard = heapq.heappop(loads)
+        shards[shard].append(party)
+        heapq.heappush(loads, (load + party["remaining"], shard))
+
+    pricing = (generator.min_rate, generator.max_rate, generator.min_margin, generator.max_margin, generator.invoice_type)
+    tasks = [(random.getrandbits(64), parties, pricing, vectorized) for parties in shards if parties]
+    with ProcessPoolExecutor(max_workers=len(tasks)) as pool:
+        results = []
+        for rows, retries, fallbacks in pool.map(_price_shard, tasks):
+            results.append(rows)
+            generator.retries += retries
+            generator.fallbacks += fallbacks
+
+    order = []
+    for shard, rows in enumerate(results):
+        order.extend([shard] * len(rows))
+    random.shuffle(order)
+
+    positions = [0] * len(results)
+    for shard in order:
+        name, quantity, rate, sale_rate, margin, value, balance = results[shard][positions[shard]]
+        positions[shard] += 1
+        invoice = {
+            "quantity": quantity,
+            "rate": rate,
+            "sale_rate": sale_rate,
+            "margin_percentage": margin,
+            "invoice_value": value,
+        }
+        yield name, invoice, balance
+
+def generate_all_invoices(party_data, start_date, end_date, start_invoice_number, product_name, min_rate, max_rate, min_margin, max_margin, invoice_type):
+    """Generate all invoices as a DataFrame (unsorted, in generation order)."""
+    import pandas as pd
+
+    all_results = list(iter_invoice_rows(
+        party_data, start_date, end_date, start_invoice_number, product_name,
+        min_rate, max_rate, min_margin, max_margin, invoice_type
+    ))
+    if not all_results:
+        raise ValueError("No invoices could be generated with the given parameters")
+
+    return pd.DataFrame(all_results)
+
+def financial_year(date_string):
+    """Return the April-March financial year a YYYY-MM-DD date falls in, as its starting year."""
+    date = datetime.strptime(date_string, '%Y-%m-%d')
+    return date.year if date.month >= 4 else date.year - 1
+
+def invoice_sort_key(row):
+    """Sort key matching the month-based (April-March) invoice number order."""
+    invoice_no = row["Invoice No"]
+    return (MONTH_ORDER[invoice_no[:3]], int(invoice_no[4:]))
 
-        # Sort by invoice number based on invoice type
+def write_invoice_rows(rows, invoice_type, out, presorted=True):
+    """Write invoice rows as CSV to `out` as they arrive and return the row count.
+
+    Rows come out of the generator in invoice number order. Sales numbers
+    (A000662) and purchase numbers within one financial year are then already
+    sorted, so nothing is buffered. Purchase runs crossing a financial year
+    (`presorted=False`) must be buffered to apply the April-March month order.
+    """
+    if not presorted:
+        rows = sorted(rows, key=invoice_sort_key)
+
+    columns = SALES_COLUMNS if invoice_type == 'sales' else PURCHASE_COLUMNS
+    writer = csv.writer(out, lineterminator='\n')
+    count = 0
+    for row in rows:
+        if count == 0:
+            writer.writerow(columns)
+        writer.writerow([row[column] for column in columns])
+        count += 1
+
+    if count == 0:
+        raise ValueError("No invoices could be generated with the given parameters")
+    return count
+
+def write_invoice_table(rows, invoice_type, out, fmt, presorted=True):
+    """Write typed invoice rows to the byte stream `out` as Parquet or Arrow and return the row count.
+
+    Same ordering rules as `write_invoice_rows`; rows are converted to
+    typed columns and written TABLE_BATCH_SIZE at a time.
+    """
+    pa = import_pyarrow()
+    if not presorted:
+        rows = sorted(rows, key=invoice_sort_key)
+
+    columns = SALES_COLUMNS if invoice_type == 'sales' else PURCHASE_COLUMNS
+    writer = TableWriter(out, fmt)
+    rows = iter(rows)
+    count = 0
+    while True:
+        batch = list(itertools.islice(rows, TABLE_BATCH_SIZE))
+        if not batch:
+            break
+        writer.write(pa.table({
+            column: invoice_column(column, [row[column] for row in batch]) for column in columns
+        }))
+        count += len(batch)
+
+    if count == 0:
+        raise ValueError("No invoices could be generated with the given parameters")
+    writer.close()
+    return count
+
+def invoice_column(name, values):
+    """Arrow array for one output column of typed invoice rows."""
+    pa = import_pyarrow()
+    if name in DATE_COLUMNS:
+        return pa.array(values, pa.date32())
+    if name in HUNDREDTHS_COLUMNS:
+        return decimal_array(values)
+    if name in INTEGER_COLUMNS:
+        return pa.array(values, pa.int64())
+    return pa.array(values, pa.string())
+
+def run(argv, out):
+    """Generate invoices for one command line (`argv[0]` is the program name) and write them to `out`."""
+    argv = list(argv)
+    # Per-stage timings as JSON on stderr, and/or a cProfile dump of the run
+    metrics, profile_path = pop_metrics_options(argv, "generate_invoices")
+    with measured(metrics, profile_path):
+        run_generation(argv, out, metrics)
+
+def invoice_type_arg(value):
+    """The invoice type argument `value`, checked against INVOICE_TYPES."""
+    if value not in INVOICE_TYPES:
+        raise ValueError(f"Invalid invoice type: {value} (expected {' or '.join(INVOICE_TYPES)})")
+    return value
+
+def run_generation(argv, out, metrics, tap=None):
+    """Body of `run`, with its stages timed by `metrics` (see run_metrics.py).
+
+    `tap(rows)` wraps the iterator of typed rows on their way to the writer,
+    e.g. to collect columns for the payment scheduler (see
+    invoice_pipeline.py). Returns the output format.
+    """
+    # Per-party and per-month totals, reconciled against the balances, as JSON
+    rollups_path = pop_option(argv, "--rollups")
+    # Price invoices in NumPy batches instead of one at a time
+    vectorized = pop_flag(argv, "--vectorized")
+    # Price purchase parties in this many parallel processes
+    workers = pop_option(argv, "--workers", default=1, cast=int)
+    if workers < 1:
+        raise ValueError("--workers must be a positive integer")
+    # Seed the RNG so party names, date weights and invoices are reproducible
+    seed = pop_option(argv, "--seed", cast=int)
+    if seed is not None:
+        random.seed(seed)
+    # Memory-map the party file instead of reading it into a buffer
+    use_mmap = pop_flag(argv, "--mmap")
+    # Continue the series saved in a state file, and/or save one for the next run
+    resume_path = pop_option(argv, "--resume")
+    save_state_path = pop_option(argv, "--save-state")
+    if resume_path is not None and seed is not None:
+        raise ValueError("--seed cannot be combined with --resume; the state file holds the RNG state")
+    # Restores the RNG before anything random is drawn
+    with metrics.stage("setup"):
+        resume_state = load_state(resume_path) if resume_path is not None else None
+    # Output as CSV text (default) or typed Parquet / Arrow IPC
+    fmt = pop_option(argv, "--format", default="csv", cast=output_format)
+    if fmt != 'csv':
+        # Fail before generating anything if pyarrow is missing
+        import_pyarrow()
+    # Every option has been taken out by now, so a flag left over is a typo or another script's option
+    unknown = [arg for i, arg in enumerate(argv[1:], 1) if arg.startswith("--") and not (i == 4 and arg == "--generate")]
+    if unknown:
+        raise ValueError(f"Unknown option: {' '.join(unknown)}")
+
+    # Check if we're using the party data file or generating new data
+    party_data_file = None
+    if len(argv) in (12, 13) and argv[4] == "--generate":
+        # Auto-generate mode
+        start_date = argv[1]
+        end_date = argv[2]
+        start_invoice_number = argv[3]
+        total_amount = argv[5]
+        party_limit = argv[6]
+        product_name = argv[7]
+        min_rate = float(argv[8])
+        max_rate = float(argv[9])
+        min_margin = float(argv[10])
+        max_margin = float(argv[11])
+        invoice_type = invoice_type_arg(argv[12]) if len(argv) == 13 else 'purchase'
+        
+        # Generate party data only for purchase invoices
         if invoice_type == 'sales':
-            # For sales invoices (A000662 format), just sort by the numeric part
-            df["Invoice Number"] = df["Invoice No"].str[1:].astype(int)
-            df = df.sort_values(by=["Invoice Number"]).drop(columns=["Invoice Number"])
+            # For sales, use a single entry with the total amount
+            party_data = {"CASH": to_paise(total_amount)}
         else:
-            # For purchase invoices (MON-000 format), keep existing month-based sorting
-            df["Month"] = df["Invoice No"].str[:3]
-            df["Invoice Number"] = df["Invoice No"].str[4:].astype(int)
-            month_order = {
-                "APR": 1, "MAY": 2, "JUN": 3, "JUL": 4, "AUG": 5, "SEP": 6,
-                "OCT": 7, "NOV": 8, "DEC": 9, "JAN": 10, "FEB": 11, "MAR": 12
-            }
-            df["Month Order"] = df["Month"].map(month_order)
-            df = df.sort_values(by=["Month Order", "Invoice Number"]).drop(
-                columns=["Month", "Month Order", "Invoice Number"]
-            )
+            # For purchases, generate party data as before
+            with metrics.stage("parties"):
+                party_data = generate_party_dataset(total_amount, party_limit)
+
+    elif len(argv) in (10, 11):
+        # Manual party data file mode
+        start_date = argv[1]
+        end_date = argv[2]
+        start_invoice_number = argv[3]
+        party_data_file = argv[4]
+        product_name = argv[5]
+        min_rate = float(argv[6])
+        max_rate = float(argv[7])
+        min_margin = float(argv[8])
+        max_margin = float(argv[9])
+        invoice_type = invoice_type_arg(argv[10]) if len(argv) == 11 else 'purchase'
+
+        # Read party data from CSV, summing duplicate parties
+        try:
+            with metrics.stage("parties"):
+                party_data = load_party_file(party_data_file, use_mmap=use_mmap)
+        except Exception as e:
+            raise Exception(f"Error reading party data file: {str(e)}")
+
+        # A resumed run may only use up balances carried from the last one
+        if not party_data and resume_state is None:
+            raise ValueError("No valid party data found in the input file")
+    else:
+        raise ValueError("Invalid number of arguments. Use either:\n" +
+                       "1. Auto-generate mode: 11 arguments (with --generate)\n" +
+                       "2. Manual file mode: 9 arguments (with party data file)")
+
+    normalized = party_data_file is not None
+    generator = None
+    balances = {}
+    if resume_state is not None or save_state_path is not None or metrics.enabled:
+        with metrics.stage("setup"):
+            if resume_state is not None:
+                party_data = carry_balances(resume_state["balances"], party_data, normalized)
+                normalized = True
+            generator = InvoiceGenerator(start_date, end_date, start_invoice_number, min_rate, max_rate, min_margin, max_margin, invoice_type, resume_state=resume_state)
+        first_number = generator.global_invoice_counter
+
+    # Generate invoices and stream them out as they are made
+    rows = iter_invoice_rows(
+        party_data,
+        start_date,
+        end_date,
+        start_invoice_number,
+        product_name,
+        min_rate,
+        max_rate,
+        min_margin,
+        max_margin,
+        invoice_type,
+        vectorized=vectorized,
+        workers=workers,
+        typed=fmt != 'csv' or tap is not None or rollups_path is not None,
+        normalized=normalized,
+        generator=generator,
+        balances=balances
+    )
+    rows = metrics.timed("invoices", rows)
+    if tap is not None:
+        rows = tap(rows)
+    if rollups_path is not None:
+        rollups = InvoiceRollups(invoice_type)
+        rows = rollups.tap(rows)
+    if fmt == 'csv' and (tap is not None or rollups_path is not None):
+        rows = map(csv_row, rows)
+    # Sales numbers always sort in generation order; purchase numbers only
+    # while the month order (April-March) cannot wrap around
+    first_date, last_date = start_date, end_date
+    if resume_state is not None:
+        # Dates can fall back on the last resumed date or run on into carried slots
+        first_date = min(start_date, resume_state["last_invoice_date"])
+        last_date = generator.end_date.strftime('%Y-%m-%d')
+    presorted = invoice_type == 'sales' or financial_year(first_date) == financial_year(last_date)
+    with metrics.stage("write"):
+        if fmt == 'csv':
+            write_invoice_rows(rows, invoice_type, out, presorted=presorted)
+        else:
+            write_invoice_table(rows, invoice_type, binary_stream(out), fmt, presorted=presorted)
+
+    if rollups_path is not None:
+        with metrics.stage("rollups"):
+            with open(rollups_path, 'w') as f:
+                json.dump(rollups.record(opening_balances(party_data, invoice_type, normalized), balances), f)
+
+    if metrics.enabled:
+        metrics.rows = generator.global_invoice_counter - first_number
+        metrics.count("retries", generator.retries)
+        metrics.count("fallbacks", generator.fallbacks)
+
+    if save_state_path is not None:
+        save_state(save_state_path, generator_state(generator, balances))
+    return fmt
+
+def handle_job(job, out):
+    """Worker-mode handler: `job["args"]` holds the same arguments as the command line."""
+    # Fresh entropy per job, as a new process would have; --seed and --resume reseed over it
+    random.seed()
+    run(["generate_invoices.py"] + [str(arg) for arg in job.get("args", [])], out)
+
+def read_batch_jobs(path):
+    """Job specs from a JSONL file: one {"id": ..., "args": [...]} object per line.
+
+    `args` are the usual command line arguments. `id` names the job's
+    output file and defaults to job-<line number>; blank lines are skipped.
+    """
+    jobs = []
+    ids = set()
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            if not line.strip():
+                continue
+            try:
+                job = json.loads(line)
+            except ValueError as e:
+                raise ValueError(f"Invalid JSON on line {number} of {path}: {str(e)}")
+            if not isinstance(job, dict) or not isinstance(job.get("args"), list):
+                raise ValueError(f"Line {number} of {path} needs an \"args\" list")
+            job_id = str(job.get("id", f"job-{number:04d}"))
+            if not BATCH_JOB_ID.match(job_id):
+                raise ValueError(f"Invalid job id on line {number} of {path}: {job_id!r}")
+            if job_id in ids:
+                raise ValueError(f"Duplicate job id on line {number} of {path}: {job_id}")
+            ids.add(job_id)
+            jobs.append({"id": job_id, "args": [str(arg) for arg in job["args"]]})
+    return jobs
+
+def run_batch_job(task):
+    """Run one batch job into `<out_dir>/<id>.<format>` and return its manifest entry.
+
+    Failures are recorded in the entry rather than raised, so one bad spec
+    does not stop the batch. Module state (name tables, and pandas or
+    NumPy once a job needs them) stays loaded for the next job in this process.
+    """
+    job, out_dir = task
+    metrics = RunMetrics("generate_invoices")
+    partial_path = os.path.join(out_dir, f"{job['id']}.partial")
+    entry = {"id": job["id"], "args": job["args"]}
+    try:
+        argv = ["generate_invoices.py"] + job["args"]
+        # Taken out as `run` does; the manifest always holds the metrics, so only --profile matters
+        _, profile_path = pop_metrics_options(argv, "generate_invoices")
+        with open(partial_path, 'w', newline='') as out, profiled(profile_path):
+            fmt = run_generation(argv, out, metrics)
+        output = f"{job['id']}.{fmt}"
+        os.replace(partial_path, os.path.join(out_dir, output))
+        entry.update(status="ok", output=output)
+    except Exception as e:
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        entry.update(status="error", error=str(e))
+
+    record = metrics.record()
+    entry.update({key: record[key] for key in ("rows", "seconds", "cpu_seconds", "rows_per_second", "stages", "counters")})
+    return entry
+
+def run_batch(argv):
+    """`--batch jobs.jsonl --out-dir DIR [--workers N]`: run every job spec, N at a time.
+
+    Each job writes its own output file and the results, row counts and
+    timings go to DIR/manifest.json. Returns the number of failed jobs.
+    """
+    argv = list(argv)
+    jobs_path = pop_option(argv, "--batch")
+    out_dir = pop_option(argv, "--out-dir")
+    if out_dir is None:
+        raise ValueError("--batch needs --out-dir DIR")
+    # Jobs run at once; a job's own --workers still shards its pricing
+    workers = pop_option(argv, "--workers", default=1, cast=int)
+    if workers < 1:
+        raise ValueError("--workers must be a positive integer")
+    if len(argv) > 1:
+        raise ValueError(f"Unexpected arguments with --batch: {' '.join(argv[1:])}")
+
+    jobs = read_batch_jobs(jobs_path)
+    os.makedirs(out_dir, exist_ok=True)
+    started = datetime.now()
+    tasks = [(job, out_dir) for job in jobs]
+    if workers > 1 and len(jobs) > 1:
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs))) as pool:
+            entries = list(pool.map(run_batch_job, tasks))
+    else:
+        entries = [run_batch_job(task) for task in tasks]
+
+    failed = sum(entry["status"] != "ok" for entry in entries)
+    manifest = {
+        "jobs_file": jobs_path,
+        "started": started.isoformat(timespec='seconds'),
+        "seconds": round((datetime.now() - started).total_seconds(), 4),
+        "workers": workers,
+        "succeeded": len(entries) - failed,
+        "failed": failed,
+        "rows": sum(entry["rows"] for entry in entries),
+        "jobs": entries,
+    }
+    with open(os.path.join(out_dir, "manifest.json"), 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    for entry in entries:
+        if entry["status"] != "ok":
+            print(f"Job {entry['id']} failed: {entry['error']}", file=sys.stderr)
+    print(f"{manifest['succeeded']} of {len(entries)} jobs written to {out_dir} "
+          f"({manifest['rows']} invoices, {manifest['seconds']:.2f}s)", file=sys.stderr)
+    return failed
+
+def main():
+    try:
+        if "--batch" in sys.argv:
+            # Many job specs in one process (or pool), each to its own file
+            if run_batch(sys.argv):
+                sys.exit(1)
+            return
+
+        if "--worker" in sys.argv:
+            # Persistent worker mode: the name tables (and pandas, once a job needs it) stay loaded between jobs
+            job_worker.serve(handle_job, queue_size=job_worker.pop_queue_size(sys.argv))
+            return
 
-        # Output as CSV to stdout
-        df.to_csv(sys.stdout, index=False)
+        run(sys.argv, sys.stdout)
 
     except Exception as e:
         print(f"Error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
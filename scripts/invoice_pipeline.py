@@ -0,0 +1,97 @@
+"""Generate invoices and schedule their payments in one process.
+
+Usage: python3 scripts/invoice_pipeline.py <generate_invoices.py arguments> --payments PATH
+
+Invoices go to stdout exactly as generate_invoices.py writes them, and the
+payment schedule goes to PATH exactly as process_payments.py would write it
+for vouchers made from those invoices (Date = invoice date, Bill = invoice
+number, Amount = invoice value). The scheduler gets the invoices as typed
+columns collected while they are written, so there is no second process and
+nothing is formatted to CSV and parsed back. `--format` applies to both
+outputs; `--metrics` adds a "schedule" stage to the generator's stages,
+and the payment calendar options (`--daily-limit`, `--party-limits`,
+`--total-daily-limit`, `--holidays`) apply to the schedule. `--rollups PATH`
+writes the invoice rollups as generate_invoices.py does, and
+`--payment-rollups PATH` the payment rollups as process_payments.py does.
+"""
+import sys
+import traceback
+from datetime import date
+
+import numpy as np
+import pandas as pd
+
+from cli_options import pop_option
+from run_metrics import measured, pop_metrics_options
+from payment_calendar import pop_calendar_options
+from generate_invoices import run_generation
+from process_payments import PaymentRollups, add_rollups, schedule_payments, write_rollups, write_schedule
+
+# date.toordinal() of 1970-01-01, the scheduler's day zero
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+class VoucherColumns:
+    """Date, Bill, Party Name and Amount columns collected from typed invoice rows."""
+
+    def __init__(self):
+        self.days = []
+        self.bills = []
+        self.parties = []
+        self.amounts = []
+
+    def tap(self, rows):
+        """Pass `rows` through unchanged, recording each one as a voucher."""
+        for row in rows:
+            self.days.append(row["Invoice Date"].toordinal() - EPOCH_ORDINAL)
+            self.bills.append(row["Invoice No"])
+            self.parties.append(row["Party Name"])
+            self.amounts.append(row["Invoice Value (Rs.)"])
+            yield row
+
+    def frame(self):
+        """The vouchers in the form `schedule_payments` takes."""
+        return pd.DataFrame({
+            'Date': np.array(self.days, dtype='datetime64[D]').astype('datetime64[ns]'),
+            'Bill': np.array(self.bills, dtype=object),
+            'Party Name': np.array(self.parties, dtype=object),
+            'Amount Paise': np.array(self.amounts, dtype=np.int64),
+        })
+
+def run(argv, out):
+    """Generate invoices for a generate_invoices.py command line, writing them to `out` and their payments to `--payments`."""
+    argv = list(argv)
+    payments_path = pop_option(argv, "--payments")
+    if payments_path is None:
+        raise ValueError("--payments PATH is required")
+    metrics, profile_path = pop_metrics_options(argv, "invoice_pipeline")
+    calendar = pop_calendar_options(argv)
+    payment_rollups_path = pop_option(argv, "--payment-rollups")
+    payment_rollups = PaymentRollups() if payment_rollups_path is not None else None
+
+    vouchers = VoucherColumns()
+    with measured(metrics, profile_path):
+        fmt = run_generation(argv, out, metrics, tap=vouchers.tap)
+        with metrics.stage("schedule"):
+            frame = vouchers.frame()
+            result = schedule_payments(frame, calendar, typed=fmt != 'csv' or payment_rollups is not None)
+        if payment_rollups is not None:
+            with metrics.stage("rollups"):
+                result = add_rollups(payment_rollups, frame, result, fmt != 'csv')
+                write_rollups(payment_rollups, payment_rollups_path)
+        metrics.count("payments", len(result))
+
+        with open(payments_path, 'w' if fmt == 'csv' else 'wb', newline='' if fmt == 'csv' else None) as f:
+            invoices = metrics.rows
+            write_schedule(result, f, fmt, metrics)
+            # Rows per second stays about the invoices
+            metrics.rows = invoices
+
+def main():
+    try:
+        run(sys.argv, sys.stdout)
+    except Exception as e:
+        print(f"Error: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
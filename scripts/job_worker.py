@@ -0,0 +1,128 @@
+import sys
+import json
+import queue
+import threading
+import traceback
+
+from cli_options import pop_option
+
+# Protocol
+# --------
+# Jobs arrive on stdin as newline-delimited JSON objects:
+#     {"id": "42", "args": [...], "input": "..."}
+# Results go back on stdout as frames. Every frame starts with a JSON header
+# line; "data" frames are followed by exactly `bytes` bytes of payload:
+#     {"id": "42", "event": "data", "bytes": 1234}\n<1234 bytes of CSV>
+#     {"id": "42", "event": "end"}\n
+#     {"id": "42", "event": "error", "message": "..."}\n
+# A job always finishes with exactly one "end" or "error" frame, so one bad
+# job never takes the worker down with it.
+
+DEFAULT_QUEUE_SIZE = 8
+FRAME_CHUNK_SIZE = 64 * 1024
+
+_STOP = object()
+
+
+class FrameWriter:
+    """File-like object that sends everything written to it as data frames for one job."""
+
+    # Checked by pyarrow before it writes Parquet/Arrow output here
+    closed = False
+
+    def __init__(self, job_id, stream, lock, chunk_size=FRAME_CHUNK_SIZE):
+        self.job_id = job_id
+        self.stream = stream
+        self.lock = lock
+        self.chunk_size = chunk_size
+        self.pending = []
+        self.pending_size = 0
+
+    def write(self, data):
+        if isinstance(data, str):
+            data = data.encode('utf-8')
+        if data:
+            self.pending.append(data)
+            self.pending_size += len(data)
+            if self.pending_size >= self.chunk_size:
+                self.flush()
+        return len(data)
+
+    def flush(self):
+        if not self.pending:
+            return
+        payload = b''.join(self.pending)
+        self.pending = []
+        self.pending_size = 0
+        send_frame(self.stream, self.lock, {"id": self.job_id, "event": "data", "bytes": len(payload)}, payload)
+
+
+def send_frame(stream, lock, header, payload=b''):
+    """Write one frame atomically with respect to other writers."""
+    with lock:
+        stream.write(json.dumps(header).encode('utf-8') + b'\n')
+        if payload:
+            stream.write(payload)
+        stream.flush()
+
+
+def _read_jobs(source, jobs, stream, lock):
+    """Parse job lines into the bounded queue, rejecting jobs when it is full."""
+    for line in source:
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            job = json.loads(line)
+            if not isinstance(job, dict):
+                raise ValueError("Job spec must be a JSON object")
+        except ValueError as e:
+            send_frame(stream, lock, {"id": None, "event": "error", "message": f"Invalid job spec: {str(e)}"})
+            continue
+
+        try:
+            jobs.put_nowait(job)
+        except queue.Full:
+            send_frame(stream, lock, {"id": job.get("id"), "event": "error", "message": "Worker queue is full"})
+    jobs.put(_STOP)
+
+
+def serve(handler, queue_size=DEFAULT_QUEUE_SIZE, source=None, stream=None):
+    """Run jobs from `source` through `handler(job, out)` until end of input.
+
+    The handler writes its result to `out` and raises to report a failed job.
+    Expensive module state (pandas, name tables) is loaded once by the caller
+    and reused for every job.
+    """
+    source = source if source is not None else sys.stdin
+    stream = stream if stream is not None else sys.stdout.buffer
+    lock = threading.Lock()
+    jobs = queue.Queue(maxsize=queue_size)
+
+    reader = threading.Thread(target=_read_jobs, args=(source, jobs, stream, lock), daemon=True)
+    reader.start()
+
+    while True:
+        job = jobs.get()
+        if job is _STOP:
+            break
+
+        job_id = job.get("id")
+        out = FrameWriter(job_id, stream, lock)
+        try:
+            handler(job, out)
+            out.flush()
+            send_frame(stream, lock, {"id": job_id, "event": "end"})
+        except Exception as e:
+            print(f"Error in job {job_id}: {str(e)}\n{traceback.format_exc()}", file=sys.stderr)
+            # Frames already sent for this job are discarded by the client on error
+            out.pending = []
+            send_frame(stream, lock, {"id": job_id, "event": "error", "message": str(e)})
+
+
+def pop_queue_size(argv):
+    """Remove an optional `--queue-size N` from the worker command line and return N."""
+    queue_size = pop_option(argv, "--queue-size", DEFAULT_QUEUE_SIZE, int)
+    if queue_size < 1:
+        raise ValueError("--queue-size must be a positive integer")
+    return queue_size
@@ -0,0 +1,106 @@
+"""Fixed-point money helpers shared by the invoice and payment scripts.
+
+Amounts are held as integer paise (1 rupee = 100 paise) from input parsing
+to output formatting, in plain ints or int64 NumPy arrays. Rates use the
+same two-decimal scale (paise per kg) and margins are held in basis points
+(hundredths of a percent). Conversion to rupees happens only when a row is
+written out. NumPy is imported by the array functions only, so scripts
+that handle scalar amounts start without it.
+"""
+import re
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+PAISE_PER_RUPEE = 100
+
+# Plain "123", "-123.4" or "123.45": parsed with integer math, no Decimal
+_SIMPLE_AMOUNT = re.compile(r'^(-?)(\d+)(?:\.(\d{1,2}))?$')
+
+# Distance from a .5 fraction below which binary floats cannot decide a tie
+_TIE_TOLERANCE = 1e-6
+
+
+def to_paise(value):
+    """Convert a rupee amount (str, int, float or Decimal) to int paise, rounding half-up."""
+    if isinstance(value, str):
+        match = _SIMPLE_AMOUNT.match(value.strip())
+        if match:
+            sign, rupees, fraction = match.groups()
+            paise = int(rupees) * PAISE_PER_RUPEE + int((fraction or '').ljust(2, '0'))
+            return -paise if sign else paise
+    elif isinstance(value, int):
+        return value * PAISE_PER_RUPEE
+    elif isinstance(value, float):
+        return round_half_up(value, 2)
+
+    try:
+        return int((Decimal(value) * PAISE_PER_RUPEE).quantize(Decimal("1"), rounding=ROUND_HALF_UP))
+    except (InvalidOperation, ValueError, TypeError):
+        raise ValueError(f"Invalid amount: {value!r}")
+
+
+def round_half_up(value, places):
+    """Round a float half-up (away from zero) to `places` decimals, as an int in units of 10**-places.
+
+    Gives the same result as Decimal(str(value)).quantize(..., ROUND_HALF_UP),
+    but only builds a Decimal when the value is within float error of a tie.
+    """
+    scaled = abs(value) * 10 ** places
+    whole = int(scaled)
+    fraction = scaled - whole
+    if abs(fraction - 0.5) < _TIE_TOLERANCE:
+        exact = Decimal(str(value)).scaleb(places).quantize(Decimal("1"), rounding=ROUND_HALF_UP)
+        return int(exact)
+    rounded = whole + (fraction > 0.5)
+    return -rounded if value < 0 else rounded
+
+
+def div_half_up(numerator, denominator):
+    """Integer division rounded half-up (away from zero)."""
+    quotient = (abs(numerator) * 2 + abs(denominator)) // (abs(denominator) * 2)
+    return -quotient if (numerator < 0) != (denominator < 0) else quotient
+
+
+def round_half_up_array(values, places):
+    """Vectorized `round_half_up` for a float array, returning (int64 array, tie mask).
+
+    Positions flagged in the mask are too close to a tie to decide in binary
+    floating point; callers re-round them with the scalar function.
+    """
+    import numpy as np
+
+    scaled = np.abs(values) * 10 ** places
+    whole = np.floor(scaled)
+    fraction = scaled - whole
+    rounded = (whole + (fraction >= 0.5)).astype(np.int64)
+    rounded = np.where(values < 0, -rounded, rounded)
+    tie = np.abs(fraction - 0.5) < _TIE_TOLERANCE
+    return rounded, tie
+
+
+def div_half_up_array(numerator, denominator):
+    """Vectorized `div_half_up` for int64 arrays with positive denominators."""
+    import numpy as np
+
+    quotient = (np.abs(numerator) * 2 + denominator) // (denominator * 2)
+    return np.where(numerator < 0, -quotient, quotient)
+
+
+def to_paise_array(values):
+    """Convert a float array of rupee amounts to int64 paise, rounding half-up."""
+    import numpy as np
+
+    values = np.asarray(values, dtype=np.float64)
+    paise = np.floor(np.abs(values) * PAISE_PER_RUPEE + 0.5).astype(np.int64)
+    return np.where(values < 0, -paise, paise)
+
+
+def paise_to_rupees(paise):
+    """Rupee value of `paise` as a float, for CSV output."""
+    return paise / PAISE_PER_RUPEE
+
+
+def format_hundredths(value):
+    """Format an int in hundredths (paise, basis points) with exactly two decimals."""
+    sign = '-' if value < 0 else ''
+    whole, fraction = divmod(abs(value), 100)
+    return f"{sign}{whole}.{fraction:02d}"
@@ -0,0 +1,165 @@
+"""Daily payment caps and blocked dates for process_payments.py.
+
+A PaymentCalendar holds the per-party daily cap (one default, with
+overrides for named parties), an optional cap on the total paid to all
+parties on one day, and blocked dates such as bank holidays. Dates are
+day numbers (days since 1970-01-01). Blocked dates are taken out of the
+timeline altogether: schedules work in "open days", numbered
+consecutively, and only the final payment dates are mapped back to the
+calendar, so a run of holidays costs no more than a single one.
+"""
+import csv
+from datetime import datetime
+
+import numpy as np
+
+from cli_options import pop_option
+from money import to_paise
+
+# Default maximum paid to one party on one day, in paise
+DAILY_PAYMENT_LIMIT = to_paise(20000)
+
+# 1970-01-01, day zero of the scheduler's day numbers
+EPOCH = datetime(1970, 1, 1)
+
+
+class PaymentCalendar:
+    """Per-party and total daily caps in paise, plus blocked day numbers."""
+
+    def __init__(self, daily_limit=DAILY_PAYMENT_LIMIT, party_limits=None, total_limit=None, blocked_days=()):
+        limits = [daily_limit] + list((party_limits or {}).values())
+        if total_limit is not None:
+            limits.append(total_limit)
+        if min(limits) <= 0:
+            raise ValueError("Daily payment limits must be positive")
+        self.daily_limit = daily_limit
+        self.party_limits = dict(party_limits or {})
+        self.total_limit = total_limit
+        self.blocked = np.unique(np.asarray(list(blocked_days), dtype=np.int64))
+        # Open-day number of the first open day after each blocked day
+        self._blocked_rank = self.blocked - np.arange(len(self.blocked))
+
+    def limits(self, parties):
+        """Daily cap in paise for each name in the array `parties`."""
+        if not self.party_limits:
+            return np.full(len(parties), self.daily_limit, dtype=np.int64)
+        return np.array([self.party_limits.get(name, self.daily_limit) for name in parties], dtype=np.int64)
+
+    def open_days(self, days):
+        """Open-day numbers for the day numbers `days`; a blocked day maps to the next open day."""
+        days = np.asarray(days, dtype=np.int64)
+        if not len(self.blocked):
+            return days
+        return days - np.searchsorted(self.blocked, days, side='left')
+
+    def calendar_days(self, open_days):
+        """Day numbers for the open-day numbers `open_days` (inverse of `open_days` on open days)."""
+        open_days = np.asarray(open_days, dtype=np.int64)
+        if not len(self.blocked):
+            return open_days
+        return open_days + np.searchsorted(self._blocked_rank, open_days, side='right')
+
+
+class TotalCapacity:
+    """Room left under the total daily cap, with a union-find "next day with room" index.
+
+    Each full day points at a later day; `next_open(day)` follows the
+    pointers (compressing the path as it goes) to the first day at or after
+    `day` that still has room, so runs of full days are skipped in
+    near-constant amortised time.
+    """
+
+    def __init__(self, limit):
+        self.limit = limit
+        self.used = {}
+        self._next = {}
+
+    def next_open(self, day):
+        root = day
+        while root in self._next:
+            root = self._next[root]
+        while day != root:
+            self._next[day], day = root, self._next[day]
+        return root
+
+    def room(self, day):
+        return self.limit - self.used.get(day, 0)
+
+    def take(self, day, amount):
+        used = self.used.get(day, 0) + amount
+        self.used[day] = used
+        if used >= self.limit:
+            self._next[day] = day + 1
+
+
+def parse_day(value):
+    """Day number of a DD-MM-YYYY (voucher style) or YYYY-MM-DD date."""
+    value = value.strip()
+    for fmt in ('%d-%m-%Y', '%Y-%m-%d'):
+        try:
+            return (datetime.strptime(value, fmt) - EPOCH).days
+        except ValueError:
+            continue
+    raise ValueError(f"Invalid date: {value}")
+
+
+def load_blocked_days(path):
+    """Day numbers from a file of dates, one per line; blank lines and `#` comments are skipped."""
+    days = []
+    with open(path, 'r') as f:
+        for number, line in enumerate(f, 1):
+            line = line.split('#', 1)[0].strip()
+            if not line:
+                continue
+            try:
+                days.append(parse_day(line))
+            except ValueError as e:
+                raise ValueError(f"Line {number} of {path}: {str(e)}")
+    return days
+
+
+def load_party_limits(path):
+    """{party name: daily cap in paise} from a `Party Name,Daily Limit` CSV file.
+
+    Names must match the vouchers' Party Name exactly. A first row whose
+    limit is not a number is taken as a header.
+    """
+    limits = {}
+    with open(path, 'r', newline='') as f:
+        for number, row in enumerate(csv.reader(f), 1):
+            if not row or not any(field.strip() for field in row):
+                continue
+            if len(row) != 2:
+                raise ValueError(f"Line {number} of {path}: expected Party Name,Daily Limit")
+            name, limit = row[0].strip(), row[1].strip()
+            try:
+                limits[name] = to_paise(limit)
+            except ValueError:
+                if number == 1:
+                    continue
+                raise ValueError(f"Line {number} of {path}: invalid limit {limit!r}")
+    return limits
+
+
+def pop_calendar_options(argv):
+    """Remove the payment calendar options from `argv` and return their PaymentCalendar.
+
+    --daily-limit RUPEES    cap per party per day (default 20000)
+    --party-limits PATH     per-party caps, `Party Name,Daily Limit` CSV
+    --total-daily-limit RUPEES   cap on all parties together per day
+    --holidays PATH         dates on which nothing is paid, one per line
+    """
+    daily_limit = pop_option(argv, "--daily-limit", DAILY_PAYMENT_LIMIT, to_paise)
+    party_limits = pop_option(argv, "--party-limits")
+    total_limit = pop_option(argv, "--total-daily-limit", None, to_paise)
+    holidays = pop_option(argv, "--holidays")
+    return PaymentCalendar(
+        daily_limit,
+        load_party_limits(party_limits) if party_limits else None,
+        total_limit,
+        load_blocked_days(holidays) if holidays else (),
+    )
+
+
+# No overrides, no total cap, no blocked dates: the original 20000-a-day rule
+DEFAULT_CALENDAR = PaymentCalendar()
@@ -1,90 +1,621 @@
+import os
 import sys
+import csv
+import json
+import heapq
+import itertools
+import tempfile
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
 import pandas as pd
-from datetime import datetime, timedelta
 from io import StringIO
 
-def generate_payment_schedule(csv_data):
-    # Read the CSV data
-    df = pd.read_csv(StringIO(csv_data))
-    
-    # Clean the DataFrame
+import job_worker
+from cli_options import pop_flag, pop_option
+from money import to_paise_array, paise_to_rupees
+from run_metrics import NO_METRICS, measured, pop_metrics_options
+from payment_calendar import DEFAULT_CALENDAR, TotalCapacity, pop_calendar_options
+from columnar import (
+    TableWriter, binary_stream, date_array, decimal_array, hundredths_array,
+    import_pyarrow, output_format, read_table, sniff_format
+)
+
+# Voucher rows per chunk in --stream mode
+DEFAULT_CHUNK_SIZE = 100000
+
+# Stream position below any real one, for parties with nothing carried over
+NO_CARRY = np.iinfo(np.int64).min
+
+# Read as text in --stream mode so every chunk gets the same column types
+TEXT_COLUMNS = {'Date': str, 'Bill': str, 'Party Name': str}
+
+def generate_payment_schedule(data, workers=1, typed=False, metrics=NO_METRICS, calendar=DEFAULT_CALENDAR, rollups=None):
+    """Payment schedule for voucher data given as CSV text or Parquet/Arrow bytes.
+
+    With `rollups` (a PaymentRollups), the vouchers and their schedule are
+    added to it on the way out.
+    """
+    with metrics.stage("parse"):
+        if isinstance(data, bytes) and sniff_format(data):
+            df = clean_voucher_table(read_table(data))
+        else:
+            if isinstance(data, bytes):
+                data = data.decode('utf-8')
+            # Read the CSV data
+            df = clean_vouchers(pd.read_csv(StringIO(data)))
+    metrics.count("invoices", len(df))
+
+    with metrics.stage("schedule"):
+        if workers > 1:
+            result = schedule_payments_parallel(df, workers, calendar, typed=typed or rollups is not None)
+        else:
+            result = schedule_payments(df, calendar, typed=typed or rollups is not None)
+    if rollups is None:
+        return result
+    with metrics.stage("rollups"):
+        return add_rollups(rollups, df, result, typed)
+
+def clean_vouchers(df):
+    """Drop summary and unnamed rows, parse dates and add the 'Amount Paise' column."""
     # Remove summary rows (rows with numbers in Date column)
     df = df[df['Date'].str.contains('-', na=False)]
+
+    # groupby() drops rows without a party name, so the schedule does too
+    df = df[df['Party Name'].notna()]
     
     # Convert date string to datetime object for sorting
     df['Date'] = pd.to_datetime(df['Date'], format='%d-%m-%Y')
-    
-    # Initialize payment records list
-    payment_records = []
-    
-    # Group by Party Name
-    party_groups = df.groupby('Party Name')
-    
-    # Process each party's invoices
-    for party_name, party_invoices in party_groups:
-        # Sort invoices by date
-        party_invoices = party_invoices.sort_values('Date')
-        
-        # Keep track of daily payments for each date
-        daily_payments = {}
-        
-        # Process each invoice
-        for _, invoice in party_invoices.iterrows():
-            invoice_date = invoice['Date']
-            invoice_number = invoice['Bill']
-            invoice_amount = float(invoice['Amount'])
-            
-            # Initialize payment date to invoice date
-            payment_date = invoice_date
-            remaining_amount = invoice_amount
-            
-            # Process payments until the invoice is fully paid
-            while remaining_amount > 0:
-                # Initialize the daily payment if not already tracked
-                if payment_date not in daily_payments:
-                    daily_payments[payment_date] = 0
-                
-                # Calculate how much can be paid today
-                payment_amount = min(remaining_amount, 20000 - daily_payments[payment_date])
-                
-                # If payment can be made today
-                if payment_amount > 0:
-                    daily_payments[payment_date] += payment_amount
-                    remaining_amount -= payment_amount
-                    
-                    # Add payment record
-                    payment_records.append({
-                        'Party Name': party_name,
-                        'Invoice Number': invoice_number,
-                        'Invoice Date': invoice_date.strftime('%d-%m-%Y'),
-                        'Invoice Amount': invoice_amount,
-                        'Payment Date': payment_date.strftime('%d-%m-%Y'),
-                        'Payment Amount': round(payment_amount, 2)
-                    })
-                
-                # Move to the next day if more payment is needed
-                if remaining_amount > 0:
-                    payment_date = payment_date + timedelta(days=1)
-    
-    # Convert to DataFrame and return
-    payment_df = pd.DataFrame(payment_records)
-    return payment_df
 
-if __name__ == '__main__':
-    try:
-        # Read input data from stdin
-        input_data = sys.stdin.read()
-        
-        # Process the data
-        result = generate_payment_schedule(input_data)
-
-        # Output the result to stdout
-        if not result.empty:
-            print(result.to_csv(index=False))
+    # Work in integer paise so daily totals add up exactly
+    df['Amount Paise'] = to_paise_array(df['Amount'].astype(float))
+    return df
+
+def clean_voucher_table(table):
+    """`clean_vouchers` for a Parquet/Arrow voucher table (Date, Bill, Party Name, Amount)."""
+    pa = import_pyarrow()
+    if pa.types.is_string(table.schema.field('Date').type) or pa.types.is_large_string(table.schema.field('Date').type):
+        # Dates stored as text get the same cleaning as CSV input
+        return clean_vouchers(table.to_pandas())
+
+    df = table.select(['Date', 'Bill', 'Party Name']).to_pandas(date_as_object=False)
+    df['Amount Paise'] = hundredths_array(table.column('Amount'))
+    return df[df['Date'].notna() & df['Party Name'].notna()]
+
+def schedule_payments(df, calendar=DEFAULT_CALENDAR, carry=None, typed=False):
+    """Split invoices into daily payments within the caps of `calendar` (a PaymentCalendar).
+
+    `df` holds 'Party Name', 'Bill', 'Date' (datetime64) and 'Amount Paise'.
+    Each party pays its invoices oldest first, and equal dates keep input order.
+    Nothing is paid on blocked dates; days are counted in open days and
+    mapped back to calendar dates at the end.
+
+    A party's payments form one continuous stream measured in "capacity
+    time", where position day * daily_limit + p means p paise of that day's
+    limit are used (daily_limit being the party's own cap). Invoice i starts
+    at the later of its own date and the end of the party's previous invoice:
+
+        end_i = max(end_{i-1}, day_i * daily_limit) + amount_i
+
+    Unrolled, end_i - S_i is a running maximum of day_j * daily_limit - S_{j-1}
+    where S is the party's cumulative amount, so every invoice is placed with
+    grouped cumsum/cummax and then cut at day boundaries without a Python loop.
+    A cap on the total paid per day couples the parties, so with one the
+    invoices are placed by `capped_payments` instead.
+
+    `carry` maps party names to the stream position where their previous
+    payments ended. Parties found in it continue from there, and it is
+    updated with every party's new end position, so a ledger can be
+    scheduled one chunk at a time.
+
+    With `typed`, dates are returned as day numbers and amounts as paise,
+    for `payments_table`.
+    """
+    if df.empty:
+        return pd.DataFrame()
+
+    # Parties in name order, each party's invoices by date
+    df = df.sort_values(['Party Name', 'Date'], kind='stable')
+    party = df['Party Name'].to_numpy()
+    amount = np.maximum(df['Amount Paise'].to_numpy(dtype=np.int64), 0)
+    invoice_day = voucher_days(df)
+
+    # Label each party's run of rows so the scans restart per party
+    first = np.flatnonzero(np.concatenate(([True], party[1:] != party[:-1])))
+    group = np.repeat(np.arange(len(first)), np.diff(np.append(first, len(df))))
+    daily_limit = calendar.limits(party[first])[group]
+    open_day = calendar.open_days(invoice_day)
+
+    if calendar.total_limit is not None:
+        if carry is not None:
+            raise ValueError("A total daily limit cannot be scheduled chunk by chunk")
+        rows, payment_day, payment_amount = capped_payments(group, amount, invoice_day, open_day, daily_limit, calendar.total_limit)
+        return payment_frame(df, party, invoice_day, rows, calendar.calendar_days(payment_day), payment_amount, typed)
+
+    paid_before = pd.Series(amount).groupby(group).cumsum().to_numpy() - amount
+    frontier = pd.Series(open_day * daily_limit - paid_before).groupby(group).cummax().to_numpy()
+    if carry:
+        carried = np.array([carry.get(name, NO_CARRY) for name in party[first]], dtype=np.int64)
+        frontier = np.maximum(frontier, carried[group])
+    start = frontier + paid_before
+    end = start + amount
+    if carry is not None:
+        last = np.append(first[1:], len(df)) - 1
+        carry.update(zip(party[last], end[last].tolist()))
+
+    # One output row per day an invoice touches
+    first_day = start // daily_limit
+    days = np.where(amount > 0, (end - 1) // daily_limit - first_day + 1, 0)
+    rows = np.repeat(np.arange(len(df)), days)
+    if len(rows) == 0:
+        return pd.DataFrame()
+    offset = np.arange(len(rows)) - np.repeat(np.cumsum(days) - days, days)
+    payment_day = first_day[rows] + offset
+    payment_amount = (
+        np.minimum(end[rows], (payment_day + 1) * daily_limit[rows])
+        - np.maximum(start[rows], payment_day * daily_limit[rows])
+    )
+    return payment_frame(df, party, invoice_day, rows, calendar.calendar_days(payment_day), payment_amount, typed)
+
+def capped_payments(group, amount, invoice_day, open_day, daily_limit, total_limit):
+    """Place invoices under per-party caps and a cap of `total_limit` paise on each day's total.
+
+    Arguments are per-invoice arrays in party and date order: party label,
+    amount, invoice day, its open-day number and the party's daily cap.
+    Invoices are paid oldest first across all parties (equal dates in party
+    order, so an invoice dated on a holiday goes ahead of the next day's), each
+    party still paying its own invoices one after another. A union-find
+    index over full days (TotalCapacity) finds the next day with room, so
+    the loop takes one step per payment made rather than per day tried.
+
+    Returns (invoice row, open day, paise) arrays, ordered by row then day.
+    """
+    capacity = TotalCapacity(total_limit)
+    # Party label -> (open day its payments reached, paise already paid that day)
+    reached = {}
+    rows, days, paid = [], [], []
+    groups, amounts, open_days, limits = group.tolist(), amount.tolist(), open_day.tolist(), daily_limit.tolist()
+    for i in np.lexsort((np.arange(len(amounts)), invoice_day)).tolist():
+        remaining = amounts[i]
+        if remaining <= 0:
+            continue
+        limit = limits[i]
+        day, used = reached.get(groups[i], (open_days[i], 0))
+        if day < open_days[i]:
+            day, used = open_days[i], 0
+        while remaining:
+            free = capacity.next_open(day)
+            if free != day:
+                day, used = free, 0
+            payment = min(remaining, limit - used, capacity.room(day))
+            capacity.take(day, payment)
+            rows.append(i)
+            days.append(day)
+            paid.append(payment)
+            remaining -= payment
+            used += payment
+            if used == limit:
+                day, used = day + 1, 0
+        reached[groups[i]] = (day, used)
+
+    order = np.argsort(np.array(rows, dtype=np.int64), kind='stable')
+    return (
+        np.array(rows, dtype=np.int64)[order],
+        np.array(days, dtype=np.int64)[order],
+        np.array(paid, dtype=np.int64)[order],
+    )
+
+def payment_frame(df, party, invoice_day, rows, payment_day, payment_amount, typed):
+    """Schedule rows for payments of `payment_amount` paise on `payment_day` against invoice `rows` of `df`."""
+    if len(rows) == 0:
+        return pd.DataFrame()
+    invoice_amount = df['Amount Paise'].to_numpy(dtype=np.int64)[rows]
+    if typed:
+        dates, money = (lambda days: days), (lambda paise: paise)
+    else:
+        dates, money = format_days, paise_to_rupees
+
+    return pd.DataFrame({
+        'Party Name': party[rows],
+        'Invoice Number': df['Bill'].to_numpy()[rows],
+        'Invoice Date': dates(invoice_day)[rows],
+        'Invoice Amount': money(invoice_amount),
+        'Payment Date': dates(payment_day),
+        'Payment Amount': money(payment_amount),
+    })
+
+def payments_table(result):
+    """Arrow table for a typed schedule: date32 dates and decimal128(18, 2) amounts."""
+    pa = import_pyarrow()
+    bills = result['Invoice Number']
+    return pa.table({
+        'Party Name': pa.array(result['Party Name'], pa.string()),
+        # Numeric invoice numbers stay numeric; anything else is text
+        'Invoice Number': pa.array(bills, None if pd.api.types.is_numeric_dtype(bills) else pa.string()),
+        'Invoice Date': date_array(result['Invoice Date']),
+        'Invoice Amount': decimal_array(result['Invoice Amount']),
+        'Payment Date': date_array(result['Payment Date']),
+        'Payment Amount': decimal_array(result['Payment Amount']),
+    })
+
+def schedule_payments_parallel(df, workers, calendar=DEFAULT_CALENDAR, typed=False):
+    """`schedule_payments` with parties spread over a pool of `workers` processes.
+
+    Parties share no state, so they are dealt into batches balanced by
+    invoice count, largest party first onto the lightest batch. Each batch
+    comes back in party order, and a stable sort on the party name merges
+    them into the same rows and order as a single-process run. A total
+    daily cap ties the parties together, so it is scheduled in one process.
+    """
+    counts = df['Party Name'].value_counts()
+    if workers < 2 or len(counts) < 2 or calendar.total_limit is not None:
+        return schedule_payments(df, calendar, typed=typed)
+
+    batch_of = {}
+    loads = [(0, batch) for batch in range(min(workers, len(counts)))]
+    for party, count in counts.items():
+        load, batch = heapq.heappop(loads)
+        batch_of[party] = batch
+        heapq.heappush(loads, (load + count, batch))
+
+    batches = [batch for _, batch in df.groupby(df['Party Name'].map(batch_of))]
+    with ProcessPoolExecutor(max_workers=len(batches)) as pool:
+        results = pool.map(
+            schedule_payments, batches, [calendar] * len(batches), [None] * len(batches), [typed] * len(batches)
+        )
+        results = [result for result in results if not result.empty]
+    if not results:
+        return pd.DataFrame()
+    return pd.concat(results, ignore_index=True).sort_values('Party Name', kind='stable', ignore_index=True)
+
+def voucher_days(df):
+    """Day numbers (days since 1970-01-01) of the datetime64 'Date' column."""
+    return df['Date'].to_numpy().astype('datetime64[D]').astype(np.int64)
+
+def format_days(days):
+    """Format an array of day numbers (days since 1970-01-01) as DD-MM-YYYY strings."""
+    unique_days, index = np.unique(days, return_inverse=True)
+    labels = pd.DatetimeIndex(unique_days.astype('datetime64[D]')).strftime('%d-%m-%Y')
+    return np.asarray(labels, dtype=object)[index]
+
+def csv_schedule(result):
+    """The CSV form of a typed `schedule_payments` result, identical to an untyped one."""
+    if result.empty:
+        return result
+    result = result.copy()
+    for column in ('Invoice Date', 'Payment Date'):
+        result[column] = format_days(result[column].to_numpy())
+    for column in ('Invoice Amount', 'Payment Amount'):
+        result[column] = paise_to_rupees(result[column].to_numpy())
+    return result
+
+class PaymentRollups:
+    """Per-party, per-month and per-day totals of a payment run, for `--rollups`.
+
+    `add` is given each batch of vouchers with its typed schedule as it is
+    made (the whole ledger at once, or one chunk at a time with --stream)
+    and keeps only grouped sums, so the ledger is never scanned again.
+    `record` merges them and reconciles each party's payments against the
+    amounts its vouchers asked for.
+    """
+
+    def __init__(self):
+        self.party_vouchers = []
+        self.party_payments = []
+        self.month_vouchers = []
+        self.day_payments = []
+
+    def add(self, vouchers, result):
+        amount = vouchers['Amount Paise'].to_numpy(dtype=np.int64)
+        frame = pd.DataFrame({
+            'party': vouchers['Party Name'].to_numpy(),
+            'month': voucher_days(vouchers).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64),
+            'invoices': 1,
+            # Zero and negative amounts are never paid
+            'not_payable': (amount <= 0).astype(np.int64),
+            'invoiced': np.maximum(amount, 0),
+        })
+        self.party_vouchers.append(frame.groupby('party')[['invoices', 'not_payable', 'invoiced']].sum())
+        self.month_vouchers.append(frame.groupby('month')[['invoices', 'invoiced']].sum())
+        if result.empty:
+            return
+
+        payments = pd.DataFrame({
+            'party': result['Party Name'].to_numpy(),
+            'day': result['Payment Date'].to_numpy(dtype=np.int64),
+            'payments': 1,
+            'paid': result['Payment Amount'].to_numpy(dtype=np.int64),
+        })
+        self.party_payments.append(payments.groupby('party').agg(
+            payments=('payments', 'sum'), paid=('paid', 'sum'), first_day=('day', 'min'), last_day=('day', 'max')
+        ))
+        self.day_payments.append(payments.groupby('day')[['payments', 'paid']].sum())
+
+    def record(self):
+        """JSON-ready rollups: totals, per-party, per-month and per-day rows, and the reconciliation."""
+        aggregations = {'invoices': 'sum', 'not_payable': 'sum', 'invoiced': 'sum',
+                        'payments': 'sum', 'paid': 'sum', 'first_day': 'min', 'last_day': 'max'}
+        parties = merge_rollups(self.party_vouchers, aggregations).join(
+            merge_rollups(self.party_payments, aggregations), how='outer'
+        )
+        parties[['invoices', 'not_payable', 'invoiced', 'payments', 'paid']] = (
+            parties[['invoices', 'not_payable', 'invoiced', 'payments', 'paid']].fillna(0).astype(np.int64)
+        )
+        days = merge_rollups(self.day_payments, aggregations)
+        day_labels = format_days(days.index.to_numpy(dtype=np.int64))
+
+        # Vouchers by invoice month, payments by payment month
+        months = merge_rollups(self.month_vouchers, aggregations).join(
+            days.groupby(days.index.to_numpy(dtype=np.int64).astype('datetime64[D]').astype('datetime64[M]').astype(np.int64)).sum(),
+            how='outer'
+        ).fillna(0).astype(np.int64)
+        month_labels = np.datetime_as_string(months.index.to_numpy(dtype=np.int64).astype('datetime64[M]'))
+
+        party_rows = []
+        mismatched = []
+        for name, row in zip(parties.index, parties.itertuples(index=False)):
+            entry = {
+                "party": name,
+                "invoices": int(row.invoices),
+                "not_payable": int(row.not_payable),
+                "invoiced": paise_to_rupees(int(row.invoiced)),
+                "payments": int(row.payments),
+                "paid": paise_to_rupees(int(row.paid)),
+                "first_payment": format_day(row.first_day),
+                "last_payment": format_day(row.last_day),
+            }
+            party_rows.append(entry)
+            if row.invoiced != row.paid:
+                mismatched.append(entry)
+
+        return {
+            "script": "process_payments",
+            "totals": {
+                "invoices": int(parties['invoices'].sum()),
+                "not_payable": int(parties['not_payable'].sum()),
+                "invoiced": paise_to_rupees(int(parties['invoiced'].sum())),
+                "payments": int(parties['payments'].sum()),
+                "paid": paise_to_rupees(int(parties['paid'].sum())),
+            },
+            "months": [
+                {"month": label, "invoices": int(row.invoices), "invoiced": paise_to_rupees(int(row.invoiced)),
+                 "payments": int(row.payments), "paid": paise_to_rupees(int(row.paid))}
+                for label, row in zip(month_labels, months.itertuples(index=False))
+            ],
+            "days": [
+                {"date": label, "payments": int(row.payments), "paid": paise_to_rupees(int(row.paid))}
+                for label, row in zip(day_labels, days.itertuples(index=False))
+            ],
+            "parties": party_rows,
+            "reconciliation": {"balanced": not mismatched, "mismatched_parties": mismatched},
+        }
+
+def merge_rollups(frames, aggregations):
+    """Combine grouped partial sums from `PaymentRollups.add` into one row per key."""
+    if not frames:
+        return pd.DataFrame()
+    merged = pd.concat(frames)
+    return merged.groupby(level=0).agg({column: aggregations[column] for column in merged.columns})
+
+def format_day(day):
+    """DD-MM-YYYY for one day number, or None for a missing one."""
+    return None if pd.isna(day) else format_days(np.array([int(day)]))[0]
+
+def add_rollups(rollups, vouchers, result, typed):
+    """Add `vouchers` and their typed schedule `result` to `rollups`; return `result` typed or as CSV values."""
+    rollups.add(vouchers, result)
+    return result if typed else csv_schedule(result)
+
+def write_rollups(rollups, path):
+    """Write `rollups.record()` to `path` as JSON."""
+    with open(path, 'w') as f:
+        json.dump(rollups.record(), f)
+
+def write_payment_schedule(data, out, workers=1, fmt='csv', metrics=NO_METRICS, calendar=DEFAULT_CALENDAR, rollups=None):
+    """Schedule payments for voucher data and write the result to `out` as CSV, Parquet or Arrow."""
+    result = generate_payment_schedule(data, workers, typed=fmt != 'csv', metrics=metrics, calendar=calendar, rollups=rollups)
+    write_schedule(result, out, fmt, metrics)
+
+def write_schedule(result, out, fmt='csv', metrics=NO_METRICS):
+    """Write a `schedule_payments` result (typed unless `fmt` is CSV) to `out`."""
+    if result.empty:
+        raise ValueError("No payment records generated.")
+    metrics.rows = len(result)
+    with metrics.stage("write"):
+        if fmt == 'csv':
+            out.write(result.to_csv(index=False) + "\n")
         else:
-            print("No payment records generated.", file=sys.stderr)
-            sys.exit(1)
+            writer = TableWriter(binary_stream(out), fmt)
+            writer.write(payments_table(result))
+            writer.close()
+
+def stream_payment_schedule(source, out, chunk_size=DEFAULT_CHUNK_SIZE, presorted=False, fmt='csv', metrics=NO_METRICS,
+                            calendar=DEFAULT_CALENDAR, rollups=None):
+    """Schedule the voucher CSV in file `source` chunk by chunk, writing rows to `out` as they are made.
+
+    Only the last party's stream position is carried from one chunk to the
+    next, so memory is bounded by the chunk size rather than the ledger.
+    With `presorted` the input must already be ordered by party name and
+    date; otherwise it is sorted through temporary files first. Invoice
+    numbers are passed through as text. Parquet/Arrow output is written as
+    one row group or record batch per chunk. Per-party caps and blocked
+    dates apply as usual; a total daily cap needs the whole ledger at once.
+    """
+    if calendar.total_limit is not None:
+        raise ValueError("--total-daily-limit cannot be combined with --stream")
+    writer = TableWriter(binary_stream(out), fmt) if fmt != 'csv' else None
+    chunks = (clean_vouchers(chunk) for chunk in pd.read_csv(source, chunksize=chunk_size, dtype=TEXT_COLUMNS))
+    with tempfile.TemporaryDirectory(prefix='payments-') as spill_dir:
+        if not presorted:
+            chunks = sorted_voucher_chunks(chunks, chunk_size, spill_dir)
+        # Reading, cleaning and (without --presorted) the external sort
+        chunks = metrics.timed("parse", chunks)
+
+        carry = {}
+        last = None
+        header = True
+        for chunk in chunks:
+            if chunk.empty:
+                continue
+            last = check_sorted(chunk, last)
+            metrics.count("invoices", len(chunk))
+            metrics.count("chunks")
+            with metrics.stage("schedule"):
+                result = schedule_payments(chunk, calendar, carry=carry, typed=writer is not None or rollups is not None)
+            if rollups is not None:
+                with metrics.stage("rollups"):
+                    result = add_rollups(rollups, chunk, result, writer is not None)
+            # Input is ordered by party, so only the last one can continue
+            carry = {last[0]: carry[last[0]]}
+            if result.empty:
+                continue
+            metrics.rows += len(result)
+            with metrics.stage("write"):
+                if writer is not None:
+                    writer.write(payments_table(result))
+                else:
+                    out.write(result.to_csv(index=False, header=header))
+            header = False
+
+    if header:
+        raise ValueError("No payment records generated.")
+    if writer is not None:
+        writer.close()
+    else:
+        out.write("\n")
+
+def check_sorted(chunk, previous):
+    """Raise unless `chunk` continues the (party, day) `previous` in party and date order.
+
+    Returns the (party, day) of the chunk's last row.
+    """
+    party = chunk['Party Name'].to_numpy()
+    day = voucher_days(chunk)
+    if previous is not None:
+        party = np.concatenate(([previous[0]], party))
+        day = np.concatenate(([previous[1]], day))
+    same_party = party[1:] == party[:-1]
+    if np.any(party[1:] < party[:-1]) or np.any(same_party & (day[1:] < day[:-1])):
+        raise ValueError("Presorted input must be ordered by Party Name, then Date")
+    return party[-1], day[-1]
+
+def sorted_voucher_chunks(chunks, chunk_size, spill_dir):
+    """Re-chunk cleaned voucher chunks in party and date order with an external merge sort.
+
+    Each chunk is sorted in memory and spilled to `spill_dir` as one run.
+    The runs are then merged lazily, so at most one chunk plus one row per
+    run is held at a time. heapq.merge favours earlier runs on ties, which
+    keeps same-day invoices in input order.
+    """
+    runs = []
+    for chunk in chunks:
+        chunk = chunk.sort_values(['Party Name', 'Date'], kind='stable')
+        path = os.path.join(spill_dir, f"run-{len(runs)}.csv")
+        with open(path, 'w', newline='') as f:
+            csv.writer(f).writerows(zip(
+                chunk['Party Name'], chunk['Bill'].fillna(''),
+                voucher_days(chunk).tolist(), chunk['Amount Paise'].tolist(),
+            ))
+        runs.append(path)
+
+    files = [open(path, newline='') for path in runs]
+    try:
+        merged = heapq.merge(*(read_run(f) for f in files), key=lambda row: (row[0], row[2]))
+        while True:
+            rows = list(itertools.islice(merged, chunk_size))
+            if not rows:
+                break
+            party, bill, day, paise = zip(*rows)
+            yield pd.DataFrame({
+                'Party Name': party,
+                'Bill': bill,
+                'Date': pd.to_datetime(np.array(day, dtype=np.int64), unit='D'),
+                'Amount Paise': np.array(paise, dtype=np.int64),
+            })
+    finally:
+        for f in files:
+            f.close()
+
+def read_run(f):
+    """Rows of one spilled run as (party, bill, day, paise)."""
+    for party, bill, day, paise in csv.reader(f):
+        yield party, bill, int(day), int(paise)
+
+def handle_job(job, out):
+    """Worker-mode handler: `job["input"]` holds the voucher CSV text.
+
+    `job["args"]` takes the same options as the command line.
+    """
+    run(["process_payments.py"] + [str(arg) for arg in job.get("args", [])], StringIO(job.get("input", "")), out)
+
+def run(argv, source, out):
+    """Schedule the vouchers in `source` for one command line (`argv[0]` is the program name), writing to `out`."""
+    argv = list(argv)
+    workers = pop_option(argv, "--workers", default=1, cast=int)
+    if workers < 1:
+        raise ValueError("--workers must be a positive integer")
+
+    # Per-stage timings as JSON on stderr, and/or a cProfile dump of the run
+    metrics, profile_path = pop_metrics_options(argv, "process_payments")
+    with measured(metrics, profile_path):
+        run_payments(argv, workers, metrics, source, out)
+
+def main():
+    try:
+        argv = list(sys.argv)
+        if "--worker" in argv:
+            # Persistent worker mode: pandas stays loaded between jobs
+            job_worker.serve(handle_job, queue_size=job_worker.pop_queue_size(argv))
+            return
+
+        run(argv, sys.stdin, sys.stdout)
 
     except Exception as e:
         print(f"Error processing payments: {e}", file=sys.stderr)
-        sys.exit(1)
\ No newline at end of file
+        sys.exit(1)
+
+def run_payments(argv, workers, metrics, source, out):
+    """Body of `run` once `--workers` and the metrics options are handled.
+
+    `source` is a text stream; its underlying bytes are read when it has a
+    `buffer`, so Parquet/Arrow input works from stdin.
+    """
+    # Output as CSV text (default) or typed Parquet / Arrow IPC
+    fmt = pop_option(argv, "--format", default="csv", cast=output_format)
+    if fmt != 'csv':
+        # Fail before reading the input if pyarrow is missing
+        import_pyarrow()
+
+    # Daily caps (per party and in total) and dates on which nothing is paid
+    calendar = pop_calendar_options(argv)
+    # Per-party, per-month and per-day totals, reconciled against the vouchers, as JSON
+    rollups_path = pop_option(argv, "--rollups")
+    rollups = PaymentRollups() if rollups_path is not None else None
+
+    stream = pop_flag(argv, "--stream")
+    chunk_size = pop_option(argv, "--chunk-size", DEFAULT_CHUNK_SIZE, int)
+    presorted = pop_flag(argv, "--presorted")
+    if len(argv) > 1:
+        raise ValueError(f"Unknown arguments: {' '.join(argv[1:])}")
+
+    if stream:
+        if workers > 1:
+            raise ValueError("--workers cannot be combined with --stream")
+        # Bounded memory: read the input in chunks and write rows as they are made
+        if chunk_size < 1:
+            raise ValueError("--chunk-size must be at least 1")
+        stream_payment_schedule(source, out, chunk_size, presorted=presorted, fmt=fmt, metrics=metrics,
+                                calendar=calendar, rollups=rollups)
+    else:
+        # Read the input data: CSV text, or Parquet/Arrow bytes
+        with metrics.stage("read"):
+            input_data = source.buffer.read() if hasattr(source, 'buffer') else source.read()
+
+        # Process the data and write the result
+        write_payment_schedule(input_data, out, workers, fmt, metrics=metrics, calendar=calendar, rollups=rollups)
+
+    if rollups is not None:
+        with metrics.stage("rollups"):
+            write_rollups(rollups, rollups_path)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,143 @@
+"""Per-stage metrics (`--metrics`) and cProfile output (`--profile PATH`) for the scripts.
+
+Stage times are exclusive: time spent in a stage nested inside another,
+such as pricing invoices while the CSV writer pulls rows, counts only
+towards the inner stage. The stage times therefore add up to the measured
+total. The record is one JSON line on stderr, so stdout stays clean output
+and the Node worker pool logs it next to the request.
+"""
+import sys
+import json
+import time
+import cProfile
+import resource
+import contextlib
+
+from cli_options import pop_flag, pop_option
+
+
+class RunMetrics:
+    """Wall and CPU time per named stage, output rows and event counters for one run."""
+
+    def __init__(self, script, enabled=True):
+        self.script = script
+        self.enabled = enabled
+        self.stages = {}
+        self.counters = {}
+        self.rows = 0
+        # One [wall start, CPU start, nested wall, nested CPU] per open stage
+        self._open = []
+        self._started = (time.perf_counter(), time.process_time())
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        """Count the time spent in the `with` block as stage `name`."""
+        if not self.enabled:
+            yield
+            return
+        entry = [time.perf_counter(), time.process_time(), 0.0, 0.0]
+        self._open.append(entry)
+        try:
+            yield
+        finally:
+            self._open.pop()
+            wall = time.perf_counter() - entry[0]
+            cpu = time.process_time() - entry[1]
+            totals = self.stages.setdefault(name, [0.0, 0.0])
+            totals[0] += wall - entry[2]
+            totals[1] += cpu - entry[3]
+            if self._open:
+                self._open[-1][2] += wall
+                self._open[-1][3] += cpu
+
+    def timed(self, name, iterable):
+        """Iterate `iterable`, counting the time taken to produce each item as stage `name`."""
+        if not self.enabled:
+            return iterable
+        return self._timed(name, iter(iterable))
+
+    def _timed(self, name, iterator):
+        while True:
+            with self.stage(name):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def record(self):
+        seconds = time.perf_counter() - self._started[0]
+        return {
+            "script": self.script,
+            "seconds": round(seconds, 4),
+            "cpu_seconds": round(time.process_time() - self._started[1], 4),
+            "rows": self.rows,
+            "rows_per_second": round(self.rows / seconds, 1) if seconds else None,
+            "peak_rss_mb": round(peak_rss_mb(resource.RUSAGE_SELF), 1),
+            "children_peak_rss_mb": round(peak_rss_mb(resource.RUSAGE_CHILDREN), 1),
+            "stages": {
+                name: {"seconds": round(wall, 4), "cpu_seconds": round(cpu, 4)}
+                for name, (wall, cpu) in self.stages.items()
+            },
+            "counters": self.counters,
+        }
+
+
+# Default for functions taking an optional `metrics`: records nothing
+NO_METRICS = RunMetrics(None, enabled=False)
+
+
+def peak_rss_mb(who):
+    peak = resource.getrusage(who).ru_maxrss
+    # Linux reports kilobytes, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def pop_metrics_options(argv, script):
+    """Remove `--metrics` and `--profile PATH` from `argv`; return (RunMetrics, profile path or None).
+
+    Without `--metrics` the RunMetrics is disabled and its stages cost nothing.
+    """
+    enabled = pop_flag(argv, "--metrics")
+    profile_path = pop_option(argv, "--profile")
+    return RunMetrics(script, enabled=enabled), profile_path
+
+
+@contextlib.contextmanager
+def profiled(profile_path=None):
+    """Run the `with` block under cProfile and dump the stats to `profile_path`; a no-op without a path."""
+    if not profile_path:
+        yield
+        return
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(profile_path)
+
+
+@contextlib.contextmanager
+def measured(metrics, profile_path=None, report=None):
+    """Run the `with` block under cProfile (if `profile_path`) and print the metrics record after it.
+
+    The record is printed even when the block raises, with an "error" field.
+    """
+    report = report if report is not None else sys.stderr
+    error = None
+    try:
+        with profiled(profile_path):
+            yield metrics
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        if metrics.enabled:
+            record = metrics.record()
+            if error is not None:
+                record["error"] = error
+            print(json.dumps(record), file=report, flush=True)